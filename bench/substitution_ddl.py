@@ -0,0 +1,105 @@
+"""Цена CREATE TABLE IF NOT EXISTS в каждом вызове чтения и записи подмен
+
+Раньше get_user_substitutions и save_substitution перед запросом выполняли
+CREATE TABLE IF NOT EXISTS substitutions на том же соединении. Скрипт
+замеряет оба метода в текущем виде и с возвращенным старым DDL (он
+выполняется внутри того же reader()/writer(), как было в коде) на копии
+базы и печатает разницу на один вызов (лучший результат из нескольких
+раундов, режимы чередуются).
+
+    python -m bench.substitution_ddl [--db users.db] [--reads 5000] [--writes 500] [--rounds 5]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict
+
+from config.config import DATABASE_NAME
+from database.db_handler import DatabaseHandler
+
+# Оператор, который раньше выполнялся в каждом вызове
+SUBSTITUTIONS_DDL = '''CREATE TABLE IF NOT EXISTS substitutions
+                       (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER,
+                        store_id INTEGER,
+                        date TEXT,
+                        hours INTEGER,
+                        FOREIGN KEY(user_id) REFERENCES users(id),
+                        FOREIGN KEY(store_id) REFERENCES stores(id))'''
+
+
+def with_ddl(acquire: Callable):
+    """Обертка reader()/writer(), выполняющая старый DDL перед запросом"""
+    @contextmanager
+    def wrapper():
+        with acquire() as conn:
+            conn.execute(SUBSTITUTIONS_DDL)
+            yield conn
+    return wrapper
+
+
+def per_call_us(func: Callable[[int], None], count: int) -> float:
+    """Среднее время вызова в микросекундах"""
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def measure(db: DatabaseHandler, user_id: int, store_id: int,
+            reads: int, writes: int) -> Dict[str, float]:
+    """Время чтения и записи подмен на один вызов"""
+    month = datetime.now()
+    per_call_us(lambda i: db.get_user_substitutions(user_id, month), 100)  # прогрев
+    reads_us = per_call_us(lambda i: db.get_user_substitutions(user_id, month), reads)
+    # Записи вне читаемого месяца, чтобы не менять результат следующих чтений
+    writes_us = per_call_us(
+        lambda i: db.save_substitution(user_id, store_id, '2000-01-01', 4), writes)
+    return {'get_user_substitutions': reads_us, 'save_substitution': writes_us}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Цена DDL в вызовах подмен')
+    parser.add_argument('--db', default=DATABASE_NAME, help='База, копия которой используется')
+    parser.add_argument('--reads', type=int, default=5000)
+    parser.add_argument('--writes', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'bench.db')
+    shutil.copy(args.db, path)
+    db = DatabaseHandler(path)
+    try:
+        with sqlite3.connect(path) as conn:
+            user_id, store_id = conn.execute(
+                'SELECT id, COALESCE(work_store_id, (SELECT MIN(id) FROM stores)) FROM users LIMIT 1'
+            ).fetchone()
+
+        # Режимы чередуются, от шума берем лучший из раундов
+        reader, writer = db.pool.reader, db.pool.writer
+        modes = {'old': (with_ddl(reader), with_ddl(writer)), 'new': (reader, writer)}
+        best: Dict[str, Dict[str, float]] = {'old': {}, 'new': {}}
+        for _ in range(args.rounds):
+            for mode, (mode_reader, mode_writer) in modes.items():
+                db.pool.reader, db.pool.writer = mode_reader, mode_writer
+                for name, value in measure(db, user_id, store_id, args.reads, args.writes).items():
+                    best[mode][name] = min(best[mode].get(name, value), value)
+        db.pool.reader, db.pool.writer = reader, writer
+        old, new = best['old'], best['new']
+    finally:
+        db.close()
+        shutil.rmtree(workdir)
+
+    for name in old:
+        print(f"{name:24s} с DDL {old[name]:7.1f} мкс, без DDL {new[name]:7.1f} мкс, "
+              f"экономия {old[name] - new[name]:6.1f} мкс на вызов")
+
+
+if __name__ == '__main__':
+    main()
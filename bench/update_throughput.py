@@ -0,0 +1,86 @@
+"""Пропускная способность PerUserUpdateProcessor на смоделированных пользователях
+
+Каждый пользователь присылает несколько сообщений подряд, обработчик-заглушка
+ждет handler_latency секунд (как ответ Bot API). Проверяется, что обновления
+каждого пользователя обработаны строго по порядку и что пропускная
+способность растет с числом пользователей, пока не упрется в concurrency.
+
+    python -m bench.update_throughput [--concurrency 32] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from telegram import Update
+
+from utils.update_processor import PerUserUpdateProcessor
+
+
+def make_update(update_id: int, user_id: int, seq: int) -> Update:
+    """Текстовое сообщение пользователя с порядковым номером в тексте"""
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+            'text': str(seq),
+        },
+    }, None)
+
+
+async def run(users: int, updates_per_user: int, concurrency: int,
+              latency: float) -> Tuple[float, Dict[int, List[int]]]:
+    """Обработка всех обновлений, возвращает (обновлений в секунду, порядок по пользователям)"""
+    processor = PerUserUpdateProcessor(concurrency)
+    await processor.initialize()
+    handled: Dict[int, List[int]] = defaultdict(list)
+
+    async def handler(update: Update):
+        # Задержка до и после записи: без очереди пользователя порядок бы перемешался
+        await asyncio.sleep(latency / 2)
+        handled[update.effective_user.id].append(int(update.message.text))
+        await asyncio.sleep(latency / 2)
+
+    # Сообщения пользователей приходят вперемешку, как из getUpdates
+    updates = [make_update(seq * users + user_id, user_id, seq)
+               for seq in range(updates_per_user) for user_id in range(1, users + 1)]
+
+    start = time.perf_counter()
+    # Application создает задачу на каждое обновление в порядке поступления
+    tasks = [asyncio.create_task(processor.process_update(update, handler(update)))
+             for update in updates]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await processor.shutdown()
+    return len(updates) / elapsed, handled
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Пропускная способность обработки обновлений')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--updates', type=int, default=5, help='Сообщений от каждого пользователя')
+    parser.add_argument('--latency', type=float, default=0.02, help='Время обработчика, сек')
+    args = parser.parse_args()
+
+    previous = None
+    for users in (1, 2, 8, 32, 128):
+        throughput, handled = asyncio.run(run(users, args.updates, args.concurrency, args.latency))
+        for user_id in range(1, users + 1):
+            assert handled[user_id] == list(range(args.updates)), \
+                f"нарушен порядок у пользователя {user_id}: {handled[user_id]}"
+        print(f"пользователей {users:4d}: {throughput:8.1f} обн./с")
+
+        # Пока пользователей не больше concurrency, каждый новый добавляет параллельности
+        if previous is not None and users <= args.concurrency:
+            assert throughput > previous * 1.5, \
+                f"пропускная способность не выросла: {previous:.1f} -> {throughput:.1f}"
+        previous = throughput
+    print("Порядок обновлений каждого пользователя сохранен")
+
+
+if __name__ == '__main__':
+    main()
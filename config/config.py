@@ -14,4 +14,51 @@ if not BOT_TOKEN:
 
 logger.info(f"Загружена конфигурация, токен бота: {BOT_TOKEN[:10]}...")
 
-DATABASE_NAME = 'users.db' 
\ No newline at end of file
+DATABASE_NAME = 'users.db'
+
+# Минимальное число сотрудников на смене в магазине
+MIN_STAFF_PER_DAY = int(os.getenv('MIN_STAFF_PER_DAY', '2'))
+
+# Продолжительность одной смены по графику в часах
+SHIFT_HOURS = int(os.getenv('SHIFT_HOURS', '12'))
+
+# Сколько прошедших месяцев хранить в оперативных таблицах, старые уходят в архив
+ARCHIVE_KEEP_MONTHS = int(os.getenv('ARCHIVE_KEEP_MONTHS', '3'))
+# Как часто во время работы проверять, не пора ли перенести месяцы в архив (сек)
+ARCHIVE_CHECK_INTERVAL = float(os.getenv('ARCHIVE_CHECK_INTERVAL', '3600'))
+
+# Групповая фиксация изменений в базе и дополнительное окно ожидания (мс)
+DB_GROUP_COMMIT = os.getenv('DB_GROUP_COMMIT', '1') == '1'
+DB_COMMIT_WINDOW_MS = float(os.getenv('DB_COMMIT_WINDOW_MS', '0'))
+
+# Период сохранения состояний диалогов и user_data в базу (сек)
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '30'))
+
+# Сколько обновлений разных пользователей обрабатывается одновременно
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '32'))
+
+# Количество потоков для запросов к базе
+DB_WORKERS = int(os.getenv('DB_WORKERS', '16'))
+# Соединений для чтения в пуле: по одному на каждый поток, чтобы потоки не ждали соединения
+DB_READERS = int(os.getenv('DB_READERS', str(DB_WORKERS)))
+
+# Ограничения частоты отправки сообщений (в секунду): всего и в один чат
+SEND_RATE_GLOBAL = float(os.getenv('SEND_RATE_GLOBAL', '30'))
+SEND_RATE_PER_CHAT = float(os.getenv('SEND_RATE_PER_CHAT', '1'))
+# Сколько сообщений подряд можно отправить в чат без ожидания
+SEND_BURST_PER_CHAT = float(os.getenv('SEND_BURST_PER_CHAT', '3'))
+# Сколько раз повторять отправку после RetryAfter
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+
+# Способ получения обновлений: 'polling' или 'webhook'
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+
+# Локальный HTTP-сервер для режима webhook
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+# Секрет, который Telegram передает в заголовке каждого запроса;
+# обязателен, если задан WEBHOOK_URL
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+# Публичный адрес webhook; если задан, регистрируется через setWebhook при запуске
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
@@ -0,0 +1,50 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from database.db_handler import DatabaseHandler
+
+logger = logging.getLogger('TelegramBot')
+
+
+class AsyncDatabaseHandler:
+    """Асинхронная обёртка над DatabaseHandler
+
+    Каждый публичный метод DatabaseHandler доступен как корутина и выполняется
+    в отдельном пуле потоков, поэтому цикл событий не блокируется на время
+    запросов к SQLite. Количество одновременно ожидающих запросов ограничено.
+    """
+
+    def __init__(self, db: DatabaseHandler, workers: int = 4, max_pending: int = 64):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db')
+        self._slots = asyncio.Semaphore(max_pending)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполнение синхронной функции в потоке базы данных"""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        # Кэшируем обёртку, чтобы не создавать её при каждом вызове
+        setattr(self, name, method)
+        return method
+
+    def close(self):
+        """Остановка пула потоков и закрытие соединений"""
+        self._executor.shutdown(wait=True)
+        self.db.close()
+        logger.debug("Асинхронный слой базы данных остановлен")
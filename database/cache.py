@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с временем жизни записей"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        # Счетчик инвалидаций: защищает от записи устаревших данных,
+        # прочитанных до изменения
+        self._generation = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Получение значения из кэша или загрузка через loader"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        # Пустые результаты не кэшируем
+        if value is None:
+            return value
+
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = (value, time.monotonic() + self.ttl)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, key: Hashable):
+        """Удаление записи из кэша"""
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Статистика попаданий и промахов"""
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+class StoreCatalog:
+    """Кэш справочника магазинов с версией и готовыми текстами списков
+
+    Строки магазинов загружаются один раз и хранятся до следующего изменения
+    справочника: add_store и удаление магазина увеличивают версию. Если
+    задан version_loader, не реже раза в check_interval секунд перед выдачей
+    из кэша сверяется версия справочника в базе, чтобы увидеть изменения
+    других процессов (например, импорта).
+    """
+
+    def __init__(self, loader: Callable[[], List[Tuple]],
+                 version_loader: Optional[Callable[[], int]] = None,
+                 check_interval: float = 1.0):
+        self._loader = loader
+        self._version_loader = version_loader
+        self.check_interval = check_interval
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.version = 0
+        self._rows: Optional[List[Tuple]] = None
+        self._db_version: Optional[int] = None
+        self._by_id: Dict[int, Tuple] = {}
+        self._texts: Dict[str, str] = {}
+
+    def _ensure_loaded(self) -> List[Tuple]:
+        with self._lock:
+            if self._rows is not None and (
+                    self._version_loader is None
+                    or time.monotonic() - self._checked_at < self.check_interval):
+                return self._rows
+
+        # Версию читаем до строк: изменение между ними приведет к лишней перезагрузке,
+        # но не к устаревшему кэшу
+        db_version = self._version_loader() if self._version_loader else None
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._rows is not None:
+                if db_version == self._db_version:
+                    return self._rows
+                self._reset()
+            version = self.version
+
+        rows = self._loader()
+
+        with self._lock:
+            # Справочник мог измениться, пока мы читали базу
+            if version == self.version:
+                self._rows = rows
+                self._db_version = db_version
+                self._by_id = {row[0]: row for row in rows}
+            return rows
+
+    def rows(self) -> List[Tuple]:
+        """Все магазины: (id, store_number, address)"""
+        return self._ensure_loaded()
+
+    def get(self, store_id: int) -> Optional[Tuple]:
+        """Магазин по ID"""
+        rows = self._ensure_loaded()
+        with self._lock:
+            if self._rows is rows:
+                return self._by_id.get(store_id)
+        # Справочник обновился во время загрузки - ищем в прочитанных строках
+        return next((row for row in rows if row[0] == store_id), None)
+
+    def render(self, template: str) -> str:
+        """Текст списка магазинов по шаблону с полями {id}, {number}, {address}"""
+        rows = self._ensure_loaded()
+        with self._lock:
+            if self._rows is rows and template in self._texts:
+                return self._texts[template]
+            version = self.version
+
+        text = "\n".join(
+            template.format(id=store_id, number=number, address=address)
+            for store_id, number, address in rows
+        )
+
+        with self._lock:
+            if version == self.version and self._rows is rows:
+                self._texts[template] = text
+        return text
+
+    def bump(self):
+        """Новая версия справочника: сброс строк и готовых текстов"""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        """Сброс под блокировкой"""
+        self.version += 1
+        self._rows = None
+        self._db_version = None
+        self._by_id = {}
+        self._texts.clear()
@@ -0,0 +1,224 @@
+import sqlite3
+import threading
+import queue
+import time
+import logging
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from database.schedule_codec import count_shifts
+
+logger = logging.getLogger('TelegramBot')
+
+# Настройки соединений SQLite
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',      # ~16 МБ страничного кэша на соединение
+    'PRAGMA mmap_size=134217728',    # 128 МБ memory-mapped I/O
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+# Функции, доступные в запросах: (имя, число аргументов, реализация)
+SQL_FUNCTIONS = (
+    ('shift_count', 1, count_shifts),
+)
+
+
+class _CommitBatch:
+    """Группа изменений, фиксируемых одним COMMIT"""
+
+    def __init__(self):
+        self.size = 0
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+    def wait(self):
+        """Ожидание фиксации группы"""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class ConnectionPool:
+    """Пул долгоживущих соединений: одно на запись и несколько на чтение
+
+    При group_commit=True изменения от одновременных писателей выполняются
+    в одной транзакции (каждое - в своей точке сохранения) и фиксируются
+    одним COMMIT: группа остается открытой, пока есть ожидающие писатели,
+    и фиксируется последним из них. commit_window > 0 дополнительно
+    задерживает фиксацию, чтобы собрать изменения, пришедшие чуть позже.
+    Вызывающий поток возвращается только после фиксации своей группы.
+    """
+
+    def __init__(self, db_name: str, readers: int = 4, group_commit: bool = False,
+                 commit_window: float = 0.0, max_batch: int = 256):
+        self.db_name = db_name
+        self.group_commit = group_commit
+        self.commit_window = commit_window
+        self.max_batch = max_batch
+        self._closed = False
+
+        # Соединение для записи используется строго под блокировкой
+        self._writer = self._connect()
+        self._write_lock = threading.Lock()
+
+        # Соединения для чтения раздаются через очередь
+        self._readers: List[sqlite3.Connection] = [self._connect() for _ in range(readers)]
+        self._idle_readers: queue.Queue = queue.Queue()
+        for conn in self._readers:
+            self._idle_readers.put(conn)
+
+        # Групповая фиксация изменений
+        self._batch: Optional[_CommitBatch] = None
+        self._batch_opened = threading.Event()
+        self._waiting_writers = 0
+        self._waiting_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        if group_commit and commit_window > 0:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name='db-group-commit', daemon=True
+            )
+            self._flusher.start()
+
+        logger.debug(f"Пул соединений открыт: {db_name}, читателей: {readers}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открытие соединения с настроенными PRAGMA"""
+        # isolation_level=None: транзакциями управляем явно
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, isolation_level=None)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        for name, num_params, func in SQL_FUNCTIONS:
+            conn.create_function(name, num_params, func, deterministic=True)
+        return conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Получение соединения для чтения"""
+        conn = self._idle_readers.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle_readers.put(conn)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Получение соединения для записи внутри транзакции"""
+        if not self.group_commit:
+            with self._write_lock:
+                conn = self._writer
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    yield conn
+                except BaseException:
+                    conn.rollback()
+                    raise
+                else:
+                    conn.commit()
+            return
+
+        with self._waiting_lock:
+            self._waiting_writers += 1
+        with self._write_lock:
+            with self._waiting_lock:
+                self._waiting_writers -= 1
+            conn = self._writer
+            batch = self._open_batch()
+            # Точка сохранения отделяет изменения вызывающего от остальной группы
+            conn.execute('SAVEPOINT batch_item')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK TO batch_item')
+                conn.execute('RELEASE batch_item')
+                raise
+            else:
+                conn.execute('RELEASE batch_item')
+                batch.size += 1
+            finally:
+                self._maybe_commit_batch()
+        batch.wait()
+
+    @contextmanager
+    def maintenance(self) -> Iterator[sqlite3.Connection]:
+        """Соединение для записи вне транзакции (VACUUM, служебные PRAGMA)"""
+        with self._write_lock:
+            # Открытая группа фиксируется, чтобы не держать транзакцию
+            self._commit_batch()
+            yield self._writer
+
+    def _maybe_commit_batch(self):
+        """Решение о фиксации группы после очередного изменения"""
+        with self._waiting_lock:
+            has_waiting = self._waiting_writers > 0
+        batch = self._batch
+        if batch is None:
+            return
+        if batch.size >= self.max_batch:
+            self._commit_batch()
+        elif has_waiting:
+            # Группу зафиксирует один из ожидающих писателей
+            return
+        elif self.commit_window > 0:
+            # Группу зафиксирует фоновый поток по истечении окна
+            return
+        else:
+            self._commit_batch()
+
+    def _open_batch(self) -> _CommitBatch:
+        """Текущая группа изменений (вызывается под блокировкой записи)"""
+        if self._batch is None:
+            self._writer.execute('BEGIN IMMEDIATE')
+            self._batch = _CommitBatch()
+            self._batch_opened.set()
+        return self._batch
+
+    def _commit_batch(self):
+        """Фиксация текущей группы (вызывается под блокировкой записи)"""
+        batch = self._batch
+        if batch is None:
+            return
+        self._batch = None
+        self._batch_opened.clear()
+        try:
+            self._writer.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка групповой фиксации ({batch.size} изменений): {e}")
+            self._writer.rollback()
+            batch.error = e
+        finally:
+            batch.done.set()
+
+    def _flush_loop(self):
+        """Фоновая фиксация групп по истечении окна ожидания"""
+        while not self._closed:
+            self._batch_opened.wait()
+            if self._closed:
+                break
+            time.sleep(self.commit_window)
+            with self._write_lock:
+                self._commit_batch()
+
+    def flush(self):
+        """Немедленная фиксация накопленных изменений"""
+        with self._write_lock:
+            self._commit_batch()
+
+    def close(self):
+        """Фиксация накопленных изменений и закрытие всех соединений пула"""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        if self._flusher is not None:
+            self._batch_opened.set()
+            self._flusher.join()
+        with self._write_lock:
+            self._writer.close()
+        for conn in self._readers:
+            conn.close()
+        logger.debug(f"Пул соединений закрыт: {self.db_name}")
@@ -1,21 +1,93 @@
 import sqlite3
-from typing import Optional, Tuple, List
+import csv
+import calendar
+from itertools import islice
+from typing import Optional, Tuple, List, Iterator, Dict
 import logging
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from database.connection_pool import ConnectionPool
+from database.migrations import apply_migrations
+from database.cache import LRUCache, StoreCatalog
+from database.event_log import EventLog
+from database.schedule_codec import encode_schedule, decode_schedule, mask_from_days, WORK_DAY, DAY_OFF
 
 logger = logging.getLogger('TelegramBot')
 
+# Размер пачки строк для одной транзакции при массовом импорте
+IMPORT_CHUNK_SIZE = 1000
+
+# Должности сотрудников
+POSITIONS = ('Кассир Торгового Зала', 'Администратор', 'КРО',
+             'Территориальный менеджер', 'Служба Безопасности')
+
+# Должности, не относящиеся к персоналу конкретного магазина
+NON_STORE_POSITIONS = ('КРО', 'Территориальный менеджер', 'Служба Безопасности')
+
+# Должности, которым права администратора выдаются автоматически
+ADMIN_POSITIONS = ('Администратор', 'Территориальный менеджер')
+
+# Поля, по которым можно фильтровать постраничный список пользователей
+USER_PAGE_FILTERS = ('is_admin', 'position', 'work_store_id')
+
+# Триграммный индекс не находит подстроки короче трех символов
+MIN_SEARCH_TERM = 3
+
+def _fts_query(query: str) -> Optional[str]:
+    """Поисковая строка -> запрос FTS5: все слова запроса как подстроки"""
+    terms = [term for term in query.split() if len(term) >= MIN_SEARCH_TERM]
+    if not terms:
+        return None
+    # Каждое слово - отдельная фраза в кавычках, фразы объединяются через AND
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+def _glob_escape(text: str) -> str:
+    """Экранирование спецсимволов GLOB"""
+    return ''.join(f'[{ch}]' if ch in '*?[' else ch for ch in text)
+
+def _iter_csv_chunks(path: str, chunk_size: int) -> Iterator[List[Tuple[int, Dict[str, str]]]]:
+    """Потоковое чтение CSV пачками пар (номер строки, строка)"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        # Номер строки файла с учетом заголовка
+        rows = enumerate(csv.DictReader(f), start=2)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
 class DatabaseHandler:
-    def __init__(self, db_name: str):
+    def __init__(self, db_name: str, readers: int = 4,
+                 group_commit: bool = False, commit_window: float = 0.0,
+                 profile_cache_size: int = 4096, profile_cache_ttl: float = 300.0,
+                 event_flush_interval: float = 1.0):
         self.db_name = db_name
+        self.pool = ConnectionPool(db_name, readers=readers,
+                                   group_commit=group_commit, commit_window=commit_window)
+        # Кэш профилей пользователей (результаты get_user_data)
+        self.profile_cache = LRUCache(maxsize=profile_cache_size, ttl=profile_cache_ttl)
+        # Кэш справочника магазинов, сбрасывается при его изменении
+        self.store_catalog = StoreCatalog(self._load_all_stores, self._load_stores_version)
         self.setup_database()
+        # Месяцы раньше этой границы ('YYYY-MM') перенесены в архивные таблицы
+        self._archived_before = self._load_setting('archived_before') or ''
+        # Журнал изменений пишется пачками в фоне
+        self.events = EventLog(self.pool, flush_interval=event_flush_interval)
+
+    def close(self):
+        """Закрытие соединений с базой данных"""
+        self.events.close()
+        self.pool.close()
 
     def setup_database(self):
         """Создание и обновление структуры базы данных"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        
+        with self.pool.writer() as conn:
+            self._create_tables(conn.cursor())
+        # Индексы и ограничения добавляются версионными миграциями
+        apply_migrations(self.pool)
+
+    def _create_tables(self, c: sqlite3.Cursor):
+        """Создание базовых таблиц"""
         # Таблица магазинов
         c.execute('''CREATE TABLE IF NOT EXISTS stores
                      (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -52,414 +124,1020 @@ class DatabaseHandler:
                       FOREIGN KEY(user_id) REFERENCES users(id),
                       FOREIGN KEY(store_id) REFERENCES stores(id))''')
         
-        conn.commit()
-        conn.close()
+        # Таблица подмен
+        c.execute('''CREATE TABLE IF NOT EXISTS substitutions
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      user_id INTEGER,
+                      store_id INTEGER,
+                      date TEXT,
+                      hours INTEGER,
+                      FOREIGN KEY(user_id) REFERENCES users(id),
+                      FOREIGN KEY(store_id) REFERENCES stores(id))''')
 
     def add_user(self, telegram_id: int, full_name: str, barcode: str, work_store_id: Optional[int] = None) -> int:
         """Добавление нового пользователя"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('''INSERT INTO users 
-                    (telegram_id, full_name, barcode, position, work_store_id) 
-                    VALUES (?, ?, ?, ?, ?)''',
-                 (telegram_id, full_name, barcode, "Кассир Торгового Зала", work_store_id))
-        user_id = c.lastrowid
-        conn.commit()
-        conn.close()
-        return user_id
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.execute('''INSERT INTO users 
+                        (telegram_id, full_name, barcode, position, work_store_id) 
+                        VALUES (?, ?, ?, ?, ?)''',
+                     (telegram_id, full_name, barcode, "Кассир Торгового Зала", work_store_id))
+            user_id = c.lastrowid
+            return user_id
 
     def get_user_by_barcode(self, barcode: str) -> Optional[Tuple]:
         """Получение пользователя по штрих-коду"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT id FROM users WHERE barcode = ?', (barcode,))
-        result = c.fetchone()
-        conn.close()
-        return result
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id FROM users WHERE barcode = ?', (barcode,))
+            result = c.fetchone()
+            return result
 
     def get_user_data(self, user_id: int) -> Optional[Tuple]:
         """Получение данных пользователя"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('''
-            SELECT 
-                u.full_name,
-                u.barcode,
-                u.hire_date,
-                u.position,
-                u.is_admin,
-                u.work_store_id,
-                s.address
-            FROM users u
-            LEFT JOIN stores s ON u.work_store_id = s.id
-            WHERE u.id = ?
-        ''', (user_id,))
-        user_data = c.fetchone()
-        conn.close()
-        return user_data
+        return self.profile_cache.get_or_load(user_id, lambda: self._load_user_data(user_id))
+
+    def _load_user_data(self, user_id: int) -> Optional[Tuple]:
+        """Загрузка данных пользователя из базы"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT 
+                    u.full_name,
+                    u.barcode,
+                    u.hire_date,
+                    u.position,
+                    u.is_admin,
+                    u.work_store_id,
+                    s.address
+                FROM users u
+                LEFT JOIN stores s ON u.work_store_id = s.id
+                WHERE u.id = ?
+            ''', (user_id,))
+            user_data = c.fetchone()
+            return user_data
 
     def update_user_name(self, user_id: int, new_name: str):
         """Обновление имени пользователя"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('UPDATE users SET full_name = ? WHERE id = ?', 
-                 (new_name, user_id))
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.execute('UPDATE users SET full_name = ? WHERE id = ?', 
+                     (new_name, user_id))
+        self.profile_cache.invalidate(user_id)
 
     def update_user_barcode(self, user_id: int, new_barcode: str):
         """Обновление штрих-кода пользователя"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('UPDATE users SET barcode = ? WHERE id = ?', 
-                 (new_barcode, user_id))
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.execute('UPDATE users SET barcode = ? WHERE id = ?', 
+                     (new_barcode, user_id))
+        self.profile_cache.invalidate(user_id)
 
     def update_hire_date(self, user_id: int, hire_date: str):
         """Обновление даты трудоустройства"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('UPDATE users SET hire_date = ? WHERE id = ?', 
-                 (hire_date, user_id))
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.execute('UPDATE users SET hire_date = ? WHERE id = ?', 
+                     (hire_date, user_id))
+        self.profile_cache.invalidate(user_id)
 
     def set_admin_status(self, user_id: int, is_admin: bool):
         """Установка статуса администратора"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('UPDATE users SET is_admin = ? WHERE id = ?', 
-                 (1 if is_admin else 0, user_id))
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.execute('UPDATE users SET is_admin = ? WHERE id = ?', 
+                     (1 if is_admin else 0, user_id))
+        self.profile_cache.invalidate(user_id)
+        self.events.record('admin_status', user_id=user_id, details={'is_admin': bool(is_admin)})
 
     def is_user_admin(self, user_id: int) -> bool:
         """Проверка статуса админа"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT is_admin FROM users WHERE id = ?', (user_id,))
-        result = c.fetchone()
-        conn.close()
-        return bool(result[0]) if result else False
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT is_admin FROM users WHERE id = ?', (user_id,))
+            result = c.fetchone()
+            return bool(result[0]) if result else False
 
     def get_all_users(self):
         """Получение списка всех пользователей"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT id, full_name, barcode, hire_date, is_admin, position FROM users')
-        users = c.fetchall()
-        conn.close()
-        return users
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id, full_name, barcode, hire_date, is_admin, position FROM users')
+            users = c.fetchall()
+            return users
+
+    def get_users_page(self, after_id: int = 0, limit: int = 20,
+                       filters: Optional[Dict[str, object]] = None) -> Tuple[List[Tuple], bool]:
+        """Страница пользователей по ключу id (keyset-пагинация)
+
+        Возвращает строки (id, full_name, barcode, hire_date, is_admin, position)
+        с id > after_id и признак наличия следующей страницы.
+        """
+        conditions = ['id > ?']
+        params: List[object] = [after_id]
+        for column, value in (filters or {}).items():
+            if column not in USER_PAGE_FILTERS:
+                raise ValueError(f"Недопустимый фильтр пользователей: {column}")
+            conditions.append(f'{column} = ?')
+            params.append(value)
+        # Лишняя строка показывает, есть ли следующая страница
+        params.append(limit + 1)
+
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT id, full_name, barcode, hire_date, is_admin, position
+                         FROM users
+                         WHERE {' AND '.join(conditions)}
+                         ORDER BY id
+                         LIMIT ?''', params)
+            rows = c.fetchall()
+            return rows[:limit], len(rows) > limit
+
+    def search_users(self, query: str, limit: int = 20) -> List[Tuple]:
+        """Поиск пользователей по части ФИО или штрих-кода
+
+        Возвращает строки (id, full_name, barcode, position).
+        """
+        match = _fts_query(query)
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            if match:
+                c.execute('''SELECT u.id, u.full_name, u.barcode, u.position
+                             FROM users_fts
+                             JOIN users u ON u.id = users_fts.rowid
+                             WHERE users_fts MATCH ?
+                             -- Без сортировки по rank: выборка останавливается на limit совпадений
+                             LIMIT ?''', (match, limit))
+            else:
+                # Короткий запрос: поиск по началу ФИО (с заглавной буквы) или штрих-кода,
+                # GLOB с префиксом использует индексы full_name и barcode
+                prefix = _glob_escape(query.strip())
+                c.execute('''SELECT id, full_name, barcode, position
+                             FROM users
+                             WHERE full_name GLOB ? OR barcode GLOB ?
+                             LIMIT ?''', (prefix[:1].upper() + prefix[1:] + '*', prefix + '*', limit))
+            return c.fetchall()
 
     def update_user_position(self, user_id: int, position: str):
         """Обновление должности пользователя"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        
-        # Начинаем транзакцию
-        c.execute('BEGIN TRANSACTION')
+        # Все изменения выполняются в одной транзакции
         try:
-            # Получаем текущие данные пользователя
-            c.execute('SELECT is_admin FROM users WHERE id = ?', (user_id,))
-            current_admin_status = c.fetchone()[0]
-            
-            # Обновляем должность
-            c.execute('UPDATE users SET position = ? WHERE id = ?', (position, user_id))
-            
-            # Если должность КРО, СБ или Тер.менеджер - убираем привязку к магазину
-            if position in ['КРО', 'Служба Безопасности', 'Территориальный менеджер']:
-                c.execute('UPDATE users SET work_store_id = NULL WHERE id = ?', (user_id,))
-                # Убираем прикрепленные магазины в любом случае
-                c.execute('DELETE FROM admin_stores WHERE admin_id = ?', (user_id,))
+            with self.pool.writer() as conn:
+                c = conn.cursor()
+                # Получаем текущие данные пользователя
+                c.execute('SELECT is_admin, position, work_store_id FROM users WHERE id = ?', (user_id,))
+                current_admin_status, previous_position, store_id = c.fetchone()
                 
-                # Автоматически даем права админа для Территориального менеджера
-                if position == 'Территориальный менеджер':
+                # Обновляем должность
+                c.execute('UPDATE users SET position = ? WHERE id = ?', (position, user_id))
+                
+                # Если должность КРО, СБ или Тер.менеджер - убираем привязку к магазину
+                if position in NON_STORE_POSITIONS:
+                    c.execute('UPDATE users SET work_store_id = NULL WHERE id = ?', (user_id,))
+                    # Убираем прикрепленные магазины в любом случае
+                    c.execute('DELETE FROM admin_stores WHERE admin_id = ?', (user_id,))
+                    
+                    # Автоматически даем права админа для Территориального менеджера
+                    if position == 'Территориальный менеджер':
+                        c.execute('UPDATE users SET is_admin = 1 WHERE id = ?', (user_id,))
+                
+                # Если лжность Администратор - всегда даем права админа
+                elif position == 'Администратор':
                     c.execute('UPDATE users SET is_admin = 1 WHERE id = ?', (user_id,))
-            
-            # Если лжность Администратор - всегда даем права админа
-            elif position == 'Администратор':
-                c.execute('UPDATE users SET is_admin = 1 WHERE id = ?', (user_id,))
-            
-            # Для остальных долностей сохраняем текущий статус админа
-            else:
-                pass
-            
-            conn.commit()
+                
+                # Для остальных долностей сохраняем текущий статус админа
+                else:
+                    pass
         except sqlite3.Error as e:
-            conn.rollback()
             logger.error(f"Ошибка при обнвлении должности: {e}")
+        else:
+            is_admin = bool(current_admin_status) or position in ADMIN_POSITIONS
+            self.events.record('position', user_id=user_id, store_id=store_id,
+                               details={'position': position, 'previous': previous_position,
+                                        'is_admin': is_admin})
+            # Права администратора, выданные вместе с должностью
+            if is_admin and not current_admin_status:
+                self.events.record('admin_status', user_id=user_id,
+                                   details={'is_admin': True, 'position': position})
         finally:
-            conn.close()
+            self.profile_cache.invalidate(user_id)
 
     def get_next_store_number(self) -> str:
-        """Получение следующего номера магазина"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT COUNT(*) + 1 FROM stores')
-        next_number = c.fetchone()[0]
-        conn.close()
-        return f"M{next_number:03d}"  # Format: M001, M002, etc.
+        """Номер, который получит следующий магазин (только для отображения)"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute("SELECT value + 1 FROM sequences WHERE name = 'store_number'")
+            next_number = c.fetchone()[0]
+            return f"M{next_number:03d}"  # Format: M001, M002, etc.
 
     def add_store(self, address: str) -> Optional[int]:
         """Добавление нового магазина"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
         try:
-            store_number = self.get_next_store_number()
-            c.execute('INSERT INTO stores (store_number, address) VALUES (?, ?)',
-                     (store_number, address))
-            store_id = c.lastrowid
-            conn.commit()
-            conn.close()
+            with self.pool.writer() as conn:
+                c = conn.cursor()
+                # Номер выделяется в той же транзакции, что и вставка
+                store_number = self._allocate_store_numbers(c, 1)[0]
+                c.execute('INSERT INTO stores (store_number, address) VALUES (?, ?)',
+                         (store_number, address))
+                store_id = c.lastrowid
+            self.store_catalog.bump()
             return store_id
         except sqlite3.Error:
-            conn.close()
             return None
 
+    def delete_store(self, store_id: int):
+        """Удаление магазина"""
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            # Отвязываем сотрудников и администраторов от магазина
+            c.execute('UPDATE users SET work_store_id = NULL WHERE work_store_id = ?', (store_id,))
+            c.execute('DELETE FROM admin_stores WHERE store_id = ?', (store_id,))
+            c.execute('DELETE FROM stores WHERE id = ?', (store_id,))
+        self.store_catalog.bump()
+        # Адрес магазина входит в профили сотрудников
+        self.profile_cache.clear()
+
     def get_all_stores(self) -> List[Tuple]:
         """Получение списка всех магазинов"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT id, store_number, address FROM stores')
-        stores = c.fetchall()
-        conn.close()
-        return stores
+        return self.store_catalog.rows()
+
+    def get_stores_text(self, template: str) -> str:
+        """Готовый текст списка магазинов, например '{id}. {address}'"""
+        return self.store_catalog.render(template)
+
+    def search_stores(self, query: str, limit: int = 20) -> List[Tuple]:
+        """Поиск магазинов по части адреса или номеру магазина
+
+        Возвращает строки (id, store_number, address).
+        """
+        match = _fts_query(query)
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            if match:
+                c.execute('''SELECT s.id, s.store_number, s.address
+                             FROM stores_fts
+                             JOIN stores s ON s.id = stores_fts.rowid
+                             WHERE stores_fts MATCH ?
+                             LIMIT ?''', (match, limit))
+            else:
+                # Короткий запрос: поиск по началу адреса (как введен или с заглавной буквы),
+                # GLOB с экранированным префиксом использует индекс address
+                prefix = _glob_escape(query.strip())
+                c.execute('''SELECT id, store_number, address
+                             FROM stores
+                             WHERE address GLOB ? OR address GLOB ?
+                             ORDER BY id
+                             LIMIT ?''', (prefix + '*', prefix[:1].upper() + prefix[1:] + '*', limit))
+            stores = c.fetchall()
+            # Номер магазина (M001) ищется по точному совпадению
+            c.execute('SELECT id, store_number, address FROM stores WHERE store_number = ? COLLATE NOCASE',
+                      (query.strip(),))
+            exact = c.fetchone()
+            if exact and exact not in stores:
+                stores.insert(0, exact)
+            return stores[:limit]
+
+    def _load_all_stores(self) -> List[Tuple]:
+        """Загрузка списка магазинов из базы"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id, store_number, address FROM stores')
+            stores = c.fetchall()
+            return stores
+
+    def _load_stores_version(self) -> int:
+        """Версия справочника магазинов, которую увеличивают триггеры таблицы stores"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute("SELECT value FROM sequences WHERE name = 'stores_version'")
+            result = c.fetchone()
+            return result[0] if result else 0
 
     def get_store_by_id(self, store_id: int) -> Optional[Tuple]:
         """Получение магазина по ID"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT id, store_number, address FROM stores WHERE id = ?', (store_id,))
-        store = c.fetchone()
-        conn.close()
-        return store
+        return self.store_catalog.get(store_id)
 
     def update_user_store(self, user_id: int, store_id: Optional[int]):
         """Обновление магазина пользователя"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('UPDATE users SET work_store_id = ? WHERE id = ?', 
-                 (store_id, user_id))
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.execute('UPDATE users SET work_store_id = ? WHERE id = ?', 
+                     (store_id, user_id))
+        self.profile_cache.invalidate(user_id)
+
+    def reassign_employees(self, user_ids: List[int], store_id: Optional[int]):
+        """Перевод списка сотрудников в магазин (или открепление при store_id=None)"""
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.executemany('UPDATE users SET work_store_id = ? WHERE id = ?',
+                          [(store_id, user_id) for user_id in user_ids])
+        for user_id in user_ids:
+            self.profile_cache.invalidate(user_id)
 
     def assign_stores_to_admin(self, admin_id: int, store_ids: list):
         """Прикрепление магазинов к администратору"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        # Удаляем старые связи
-        c.execute('DELETE FROM admin_stores WHERE admin_id = ?', (admin_id,))
-        # Дбавляем новые связи
-        for store_id in store_ids:
-            c.execute('INSERT INTO admin_stores (admin_id, store_id) VALUES (?, ?)',
-                     (admin_id, store_id))
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            # Удаляем старые связи
+            c.execute('DELETE FROM admin_stores WHERE admin_id = ?', (admin_id,))
+            # Дбавляем новые связи одним пакетом (повторы номеров игнорируются)
+            c.executemany('INSERT OR IGNORE INTO admin_stores (admin_id, store_id) VALUES (?, ?)',
+                          [(admin_id, store_id) for store_id in store_ids])
 
     def get_admin_stores(self, admin_id: int):
         """Получение списка магазинов администратора"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('''SELECT s.id, s.store_number, s.address 
-                    FROM stores s 
-                    JOIN admin_stores as_link ON s.id = as_link.store_id 
-                    WHERE as_link.admin_id = ?''', (admin_id,))
-        stores = c.fetchall()
-        conn.close()
-        return stores
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT s.id, s.store_number, s.address 
+                        FROM stores s 
+                        JOIN admin_stores as_link ON s.id = as_link.store_id 
+                        WHERE as_link.admin_id = ?''', (admin_id,))
+            stores = c.fetchall()
+            return stores
 
     def get_administrators(self) -> List[Tuple]:
         """Получение списка администраторов"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT id, full_name FROM users WHERE is_admin = 1')
-        admins = c.fetchall()
-        conn.close()
-        return admins
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id, full_name FROM users WHERE is_admin = 1')
+            admins = c.fetchall()
+            return admins
+
+    def get_administrators_with_stores(self, after_id: int = 0, limit: int = -1,
+                                       admin_id: Optional[int] = None) -> List[Tuple]:
+        """Администраторы с прикрепленными магазинами одним запросом
+
+        Возвращает строки (id, full_name, [(store_number, address), ...])
+        по возрастанию id, начиная после after_id. limit=-1 - без ограничения.
+        С admin_id возвращается только этот пользователь, даже без прав админа.
+        """
+        if admin_id is not None:
+            condition, params = 'u.id = ?', [admin_id]
+        else:
+            condition, params = 'u.is_admin = 1 AND u.id > ?', [after_id]
+        params.append(limit)
+
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            # Пары "номер/адрес" склеиваются через служебные разделители ASCII,
+            # которые не встречаются в адресах
+            c.execute(f'''SELECT u.id, u.full_name,
+                                group_concat(s.store_number || char(31) || s.address, char(30))
+                         FROM (SELECT id, full_name FROM users u
+                               WHERE {condition}
+                               ORDER BY id
+                               LIMIT ?) u
+                         LEFT JOIN admin_stores as_link ON as_link.admin_id = u.id
+                         LEFT JOIN stores s ON s.id = as_link.store_id
+                         GROUP BY u.id
+                         ORDER BY u.id''', params)
+            return [
+                (user_id, full_name,
+                 [tuple(pair.split('\x1f', 1)) for pair in stores.split('\x1e')] if stores else [])
+                for user_id, full_name, stores in c.fetchall()
+            ]
 
     def get_non_admin_users(self) -> List[Tuple]:
         """Получение списка пльзователей, не являющихся администраторами"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT id, full_name FROM users WHERE is_admin = 0')
-        users = c.fetchall()
-        conn.close()
-        return users
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id, full_name FROM users WHERE is_admin = 0')
+            users = c.fetchall()
+            return users
 
     def get_store_employees(self, store_id: int) -> List[Tuple]:
         """Получение списка сотрудников магазина"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('''SELECT id, full_name, position 
-                    FROM users 
-                    WHERE work_store_id = ? 
-                    AND position != 'КРО' 
-                    AND position != 'Территориальный менеджер' 
-                    AND position != 'Служба Безопасности' ''', 
-                 (store_id,))
-        employees = c.fetchall()
-        conn.close()
-        return employees
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT id, full_name, position 
+                        FROM users 
+                        WHERE work_store_id = ? 
+                        AND position != 'КРО' 
+                        AND position != 'Территориальный менеджер' 
+                        AND position != 'Служба Безопасности' ''', 
+                     (store_id,))
+            employees = c.fetchall()
+            return employees
 
     def check_store_number_exists(self, store_number: str) -> bool:
         """Проверка существования магазина с указанным номером"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT id FROM stores WHERE store_number = ?', (store_number,))
-        result = c.fetchone() is not None
-        conn.close()
-        return result
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id FROM stores WHERE store_number = ?', (store_number,))
+            result = c.fetchone() is not None
+            return result
 
     def get_user_id_by_barcode(self, barcode: str) -> Optional[int]:
         """Получение ID пользователя по штрих-коду"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT id FROM users WHERE barcode = ?', (barcode,))
-        result = c.fetchone()
-        conn.close()
-        return result[0] if result else None
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id FROM users WHERE barcode = ?', (barcode,))
+            result = c.fetchone()
+            return result[0] if result else None
 
     def remove_all_admin_stores(self, user_id):
         """Удаляет все прикрепленные магазины у администратора"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('DELETE FROM admin_stores WHERE admin_id = ?', (user_id,))
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.execute('DELETE FROM admin_stores WHERE admin_id = ?', (user_id,))
 
     def get_store_employees_count(self, store_id: int) -> int:
         """Получение количества сотрудников магазина"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('''SELECT COUNT(*) FROM users 
-                    WHERE work_store_id = ? 
-                    AND position != 'КРО' 
-                    AND position != 'Территориальный менеджер' 
-                    AND position != 'Служба Безопасности' ''', 
-                 (store_id,))
-        count = c.fetchone()[0]
-        conn.close()
-        return count
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            # Чтение по первичному ключу сводной таблицы (store_id, position)
+            c.execute(f'''SELECT COALESCE(SUM(headcount), 0) FROM store_headcounts
+                         WHERE store_id = ?
+                         AND position NOT IN ({', '.join('?' * len(NON_STORE_POSITIONS))})''',
+                      (store_id, *NON_STORE_POSITIONS))
+            count = c.fetchone()[0]
+            return count
+
+    def get_all_store_headcounts(self) -> Dict[int, Dict[str, int]]:
+        """Численность сотрудников всех магазинов по должностям: {store_id: {position: count}}"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT store_id, position, headcount FROM store_headcounts')
+            headcounts: Dict[int, Dict[str, int]] = {}
+            for store_id, position, headcount in c.fetchall():
+                headcounts.setdefault(store_id, {})[position] = headcount
+            return headcounts
 
     def save_schedule(self, user_id: int, store_id: int, month: str, schedule_data: str):
         """Сохранение графика работы"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('''INSERT OR REPLACE INTO schedules 
-                     (user_id, store_id, month, schedule_data) 
-                     VALUES (?, ?, ?, ?)''',
-                  (user_id, store_id, month, schedule_data))
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.execute('''INSERT OR REPLACE INTO schedules 
+                         (user_id, store_id, month, schedule_data, shift_mask, days_in_month) 
+                         VALUES (?, ?, ?, ?, ?, ?)''',
+                      (user_id, store_id, month, schedule_data,
+                       encode_schedule(schedule_data), len(schedule_data)))
+        self.events.record('schedule', user_id=user_id, store_id=store_id,
+                           details={'month': month, 'schedule': schedule_data})
 
     def get_schedule(self, user_id: int, store_id: int, month: str) -> Optional[str]:
         """Получение графика работы пользователя"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
+        with self.pool.reader() as conn:
+            c = conn.cursor()
         
-        c.execute('''SELECT schedule_data 
-                     FROM schedules 
-                     WHERE user_id = ? AND store_id = ? AND month = ?''',
-                  (user_id, store_id, month))
+            c.execute(f'''SELECT schedule_data 
+                         FROM {self._schedules_table(month)} 
+                         WHERE user_id = ? AND store_id = ? AND month = ?''',
+                      (user_id, store_id, month))
         
-        result = c.fetchone()
-        conn.close()
+            result = c.fetchone()
         
-        return result[0] if result else None
+            return result[0] if result else None
 
     def get_store_schedules(self, store_id: int, month: str) -> List[Tuple]:
         """Получение всех графиков магазина за месяц"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('''SELECT u.full_name, s.schedule_data 
-                     FROM schedules s
-                     JOIN users u ON s.user_id = u.id
-                     WHERE s.store_id = ? AND s.month = ?''',
-                  (store_id, month))
-        results = c.fetchall()
-        conn.close()
-        return results
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT u.full_name, s.schedule_data 
+                         FROM {self._schedules_table(month)} s
+                         JOIN users u ON s.user_id = u.id
+                         WHERE s.store_id = ? AND s.month = ?''',
+                      (store_id, month))
+            results = c.fetchall()
+            return results
+
+    def get_store_shift_masks(self, store_id: int, month: str) -> List[Tuple]:
+        """Битовые маски смен всех сотрудников магазина за месяц: (user_id, shift_mask)"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT user_id, shift_mask
+                         FROM {self._schedules_table(month)}
+                         WHERE store_id = ? AND month = ?''',
+                      (store_id, month))
+            return c.fetchall()
+
+    def get_month_shift_masks(self, month: str) -> List[Tuple]:
+        """Битовые маски смен всех магазинов за месяц: (store_id, shift_mask)"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT store_id, shift_mask
+                         FROM {self._schedules_table(month)}
+                         WHERE month = ? AND store_id IS NOT NULL''',
+                      (month,))
+            return c.fetchall()
+
+    def get_month_substitution_days(self, month: str) -> List[Tuple]:
+        """Подмены всех магазинов за месяц: (store_id, день месяца)"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT store_id, CAST(substr(date, 9, 2) AS INTEGER)
+                         FROM {self._substitutions_table(month)}
+                         WHERE date BETWEEN ? AND ?''',
+                      (f"{month}-01", f"{month}-31"))
+            return c.fetchall()
+
+    def _schedules_table(self, month: str) -> str:
+        """Источник графиков: архивные месяцы читаются вместе с архивом"""
+        return 'schedules_all' if month < self._archived_before else 'schedules'
+
+    def _substitutions_table(self, period_start: str) -> str:
+        """Источник подмен для периода, начинающегося с period_start ('YYYY-MM...')"""
+        return 'substitutions_all' if period_start < self._archived_before else 'substitutions'
+
+    def _month_bounds(self, month: str) -> Tuple[str, str]:
+        """Первый и последний день месяца 'YYYY-MM' в формате дат подмен"""
+        year, month_number = map(int, month.split('-'))
+        last_day = calendar.monthrange(year, month_number)[1]
+        return f"{month}-01", f"{month}-{last_day:02d}"
+
+    def get_user_month_shifts(self, month: str) -> List[Tuple]:
+        """Количество смен по графикам каждого сотрудника за месяц: (user_id, shifts)"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            # Смены = число единичных битов в маске графика
+            c.execute(f'''SELECT user_id, SUM(shift_count(shift_mask))
+                         FROM {self._schedules_table(month)}
+                         WHERE month = ?
+                         GROUP BY user_id''', (month,))
+            return c.fetchall()
+
+    def get_user_substitution_hours(self, month: str) -> List[Tuple]:
+        """Часы подмен каждого сотрудника за месяц: (user_id, hours, substitutions)"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT user_id, SUM(hours), COUNT(*)
+                         FROM {self._substitutions_table(month)}
+                         WHERE date BETWEEN ? AND ?
+                         GROUP BY user_id''', self._month_bounds(month))
+            return c.fetchall()
+
+    def get_store_substitution_hours(self, month: str) -> List[Tuple]:
+        """Часы подмен в каждом магазине за месяц: (store_id, hours, substitutions)"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT store_id, SUM(hours), COUNT(*)
+                         FROM {self._substitutions_table(month)}
+                         WHERE date BETWEEN ? AND ?
+                         GROUP BY store_id''', self._month_bounds(month))
+            return c.fetchall()
+
+    def get_store_month_totals(self, month: str) -> List[Tuple]:
+        """Итоги всех магазинов за месяц одним запросом
+
+        Возвращает строки (store_id, store_number, address, employees,
+        shifts, substitution_hours) по всем магазинам, включая пустые.
+        """
+        month_start, month_end = self._month_bounds(month)
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''WITH shifts AS (
+                             SELECT store_id,
+                                    COUNT(DISTINCT user_id) AS employees,
+                                    SUM(shift_count(shift_mask)) AS shifts
+                             FROM {self._schedules_table(month)}
+                             WHERE month = ?
+                             GROUP BY store_id
+                         ),
+                         subs AS (
+                             SELECT store_id, SUM(hours) AS hours
+                             FROM {self._substitutions_table(month)}
+                             WHERE date BETWEEN ? AND ?
+                             GROUP BY store_id
+                         )
+                         SELECT s.id, s.store_number, s.address,
+                                COALESCE(shifts.employees, 0),
+                                COALESCE(shifts.shifts, 0),
+                                COALESCE(subs.hours, 0)
+                         FROM stores s
+                         LEFT JOIN shifts ON shifts.store_id = s.id
+                         LEFT JOIN subs ON subs.store_id = s.id
+                         ORDER BY s.id''', (month, month_start, month_end))
+            return c.fetchall()
+
+    def get_store_day_workers(self, store_id: int, month: str, day: int) -> List[Tuple]:
+        """Сотрудники магазина, работающие в указанный день месяца"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT u.id, u.full_name, u.position
+                         FROM {self._schedules_table(month)} s
+                         JOIN users u ON s.user_id = u.id
+                         WHERE s.store_id = ? AND s.month = ?
+                         AND (s.shift_mask >> ?) & 1 = 1''',
+                      (store_id, month, day - 1))
+            return c.fetchall()
+
+    def get_store_month_roster(self, store_id: int, month: str) -> List[Tuple]:
+        """Получение графиков и подмен всех сотрудников магазина за месяц
+
+        Возвращает список (user_id, full_name, position, schedule_data, substitutions),
+        где substitutions - список (date, hours, address) в порядке дат.
+        Данные читаются одним запросом.
+        """
+        month_start = datetime.strptime(month, '%Y-%m')
+        month_end = month_start + relativedelta(months=1, days=-1)
+
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT u.id, u.full_name, u.position,
+                                (SELECT sc.schedule_data
+                                 FROM {self._schedules_table(month)} sc
+                                 WHERE sc.user_id = u.id AND sc.store_id = u.work_store_id
+                                 AND sc.month = ?
+                                 ORDER BY sc.id DESC LIMIT 1),
+                                sb.date, sb.hours, st.address
+                         FROM users u
+                         LEFT JOIN {self._substitutions_table(month)} sb
+                                ON sb.user_id = u.id AND sb.date BETWEEN ? AND ?
+                         LEFT JOIN stores st ON sb.store_id = st.id
+                         WHERE u.work_store_id = ?
+                         AND u.position != 'КРО'
+                         AND u.position != 'Территориальный менеджер'
+                         AND u.position != 'Служба Безопасности'
+                         ORDER BY u.id, sb.date''',
+                      (month, month_start.strftime('%Y-%m-%d'),
+                       month_end.strftime('%Y-%m-%d'), store_id))
+            rows = c.fetchall()
+
+        # Группируем строки по сотрудникам
+        roster = []
+        for user_id, full_name, position, schedule_data, date, hours, address in rows:
+            if not roster or roster[-1][0] != user_id:
+                roster.append((user_id, full_name, position, schedule_data, []))
+            if date is not None and address is not None:
+                roster[-1][4].append((date, hours, address))
+        return roster
 
     def get_user_substitutions(self, user_id: int, month: datetime) -> List[Tuple]:
         """Получение подмен пользователя за месяц"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        
-        # Создаем таблицу подмен, если она не существует
-        c.execute('''CREATE TABLE IF NOT EXISTS substitutions
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      user_id INTEGER,
-                      store_id INTEGER,
-                      date TEXT,
-                      hours INTEGER,
-                      FOREIGN KEY(user_id) REFERENCES users(id),
-                      FOREIGN KEY(store_id) REFERENCES stores(id))''')
-        
-        # Получаем все подмены пользователя за указанный месяц
-        month_start = month.replace(day=1).strftime('%Y-%m-%d')
-        month_end = (month.replace(day=1) + relativedelta(months=1, days=-1)).strftime('%Y-%m-%d')
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            
+            # Получаем все подмены пользователя за указанный месяц
+            month_start = month.replace(day=1).strftime('%Y-%m-%d')
+            month_end = (month.replace(day=1) + relativedelta(months=1, days=-1)).strftime('%Y-%m-%d')
         
-        c.execute('''SELECT s.date, s.hours, st.address 
-                     FROM substitutions s
-                     JOIN stores st ON s.store_id = st.id
-                     WHERE s.user_id = ? AND s.date BETWEEN ? AND ?
-                     ORDER BY s.date''',
-                  (user_id, month_start, month_end))
+            c.execute(f'''SELECT s.date, s.hours, st.address 
+                         FROM {self._substitutions_table(month_start)} s
+                         JOIN stores st ON s.store_id = st.id
+                         WHERE s.user_id = ? AND s.date BETWEEN ? AND ?
+                         ORDER BY s.date''',
+                      (user_id, month_start, month_end))
         
-        substitutions = c.fetchall()
-        conn.close()
-        return substitutions
+            substitutions = c.fetchall()
+            return substitutions
 
     def save_substitution(self, user_id: int, store_id: int, date: str, hours: int):
         """Сохранение подмены"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        
-        # Создаем таблицу подмен, если она не существует
-        c.execute('''CREATE TABLE IF NOT EXISTS substitutions
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      user_id INTEGER,
-                      store_id INTEGER,
-                      date TEXT,
-                      hours INTEGER,
-                      FOREIGN KEY(user_id) REFERENCES users(id),
-                      FOREIGN KEY(store_id) REFERENCES stores(id))''')
-        
-        # Сохраняем данные о подмене
-        c.execute('''INSERT INTO substitutions 
-                     (user_id, store_id, date, hours)
-                     VALUES (?, ?, ?, ?)''',
-                  (user_id, store_id, date, hours))
-        
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            
+            # Сохраняем данные о подмене
+            c.execute('''INSERT INTO substitutions 
+                         (user_id, store_id, date, hours)
+                         VALUES (?, ?, ?, ?)''',
+                      (user_id, store_id, date, hours))
+        self.events.record('substitution_create', user_id=user_id, store_id=store_id,
+                           details={'date': date, 'hours': hours})
 
     def delete_substitution(self, user_id: int, date: str):
         """Удаление подмены"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('DELETE FROM substitutions WHERE user_id = ? AND date = ?',
-                  (user_id, date))
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.execute('''DELETE FROM substitutions WHERE user_id = ? AND date = ?
+                         RETURNING store_id, hours''',
+                      (user_id, date))
+            deleted = c.fetchall()
+        for store_id, hours in deleted:
+            self.events.record('substitution_delete', user_id=user_id, store_id=store_id,
+                               details={'date': date, 'hours': hours})
 
     def update_substitution(self, user_id: int, old_date: str, new_store_id: int, new_date: str, new_hours: int):
         """Обновление подмены"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('''UPDATE substitutions 
-                     SET store_id = ?, date = ?, hours = ?
-                     WHERE user_id = ? AND date = ?''',
-                  (new_store_id, new_date, new_hours, user_id, old_date))
-        conn.commit()
-        conn.close()
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.execute('''UPDATE substitutions 
+                         SET store_id = ?, date = ?, hours = ?
+                         WHERE user_id = ? AND date = ?''',
+                      (new_store_id, new_date, new_hours, user_id, old_date))
+            updated = c.rowcount
+        if updated:
+            self.events.record('substitution_update', user_id=user_id, store_id=new_store_id,
+                               details={'old_date': old_date, 'date': new_date, 'hours': new_hours})
 
     def get_store_id_by_address(self, address: str) -> Optional[int]:
         """Получение ID магазина по адресу"""
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-        c.execute('SELECT id FROM stores WHERE address = ?', (address,))
-        result = c.fetchone()
-        conn.close()
-        return result[0] if result else None
\ No newline at end of file
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT id FROM stores WHERE address = ?', (address,))
+            result = c.fetchone()
+            return result[0] if result else None
+
+    def get_events(self, user_id: Optional[int] = None, store_id: Optional[int] = None,
+                   since: Optional[str] = None, until: Optional[str] = None,
+                   limit: int = 100) -> List[Tuple]:
+        """Журнал изменений по сотруднику, магазину и/или периоду
+
+        since и until - границы created_at в формате ISO ('2024-05-01',
+        '2024-05-01T12:00'), until не включается. Возвращает строки
+        (id, created_at, event_type, user_id, store_id, details) от новых к старым.
+        """
+        # Сначала дописываем буфер, чтобы в выборку попали последние изменения
+        self.events.flush()
+
+        conditions, params = [], []
+        if user_id is not None:
+            conditions.append('user_id = ?')
+            params.append(user_id)
+        if store_id is not None:
+            conditions.append('store_id = ?')
+            params.append(store_id)
+        if since:
+            conditions.append('created_at >= ?')
+            params.append(since)
+        if until:
+            conditions.append('created_at < ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        params.append(limit)
+
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT id, created_at, event_type, user_id, store_id, details
+                         FROM events
+                         {where}
+                         ORDER BY created_at DESC, id DESC
+                         LIMIT ?''', params)
+            return c.fetchall()
+
+    def _load_setting(self, name: str) -> Optional[str]:
+        """Чтение служебного значения из таблицы settings"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT value FROM settings WHERE name = ?', (name,))
+            result = c.fetchone()
+            return result[0] if result else None
+
+    def archive_old_months(self, keep_months: int) -> Dict[str, int]:
+        """Перенос графиков и подмен старше keep_months месяцев в архивные таблицы
+
+        Текущий месяц и keep_months предыдущих остаются в оперативных таблицах.
+        Каждый месяц переносится отдельной транзакцией, после чего
+        освободившиеся страницы возвращаются инкрементальным VACUUM.
+        """
+        cutoff = (datetime.now().replace(day=1) - relativedelta(months=keep_months)).strftime('%Y-%m')
+
+        # Граница сдвигается до переноса: читатели сразу переключаются на
+        # представления с архивом и не теряют переносимые строки
+        if cutoff > self._archived_before:
+            with self.pool.writer() as conn:
+                conn.execute('''INSERT INTO settings (name, value) VALUES ('archived_before', ?)
+                                ON CONFLICT(name) DO UPDATE SET value = excluded.value''', (cutoff,))
+            self._archived_before = cutoff
+
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT month FROM schedules WHERE month < ?
+                         UNION
+                         SELECT substr(date, 1, 7) FROM substitutions WHERE date < ?''',
+                      (cutoff, f"{cutoff}-01"))
+            months = [row[0] for row in c.fetchall()]
+
+        moved = {'schedules': 0, 'substitutions': 0}
+        for month in months:
+            month_start, month_end = f"{month}-01", f"{month}-31"
+            with self.pool.writer() as conn:
+                c = conn.cursor()
+                c.execute('''INSERT OR REPLACE INTO schedules_archive
+                             (id, user_id, store_id, month, schedule_data, shift_mask, days_in_month)
+                             SELECT id, user_id, store_id, month, schedule_data, shift_mask, days_in_month
+                             FROM schedules WHERE month = ?''', (month,))
+                c.execute('DELETE FROM schedules WHERE month = ?', (month,))
+                moved['schedules'] += c.rowcount
+                c.execute('''INSERT OR REPLACE INTO substitutions_archive (id, user_id, store_id, date, hours)
+                             SELECT id, user_id, store_id, date, hours
+                             FROM substitutions WHERE date BETWEEN ? AND ?''', (month_start, month_end))
+                c.execute('DELETE FROM substitutions WHERE date BETWEEN ? AND ?', (month_start, month_end))
+                moved['substitutions'] += c.rowcount
+
+        if months:
+            logger.info(f"Архивировано месяцев: {len(months)} (графиков: {moved['schedules']}, "
+                        f"подмен: {moved['substitutions']})")
+            self._incremental_vacuum()
+        return moved
+
+    def _incremental_vacuum(self):
+        """Возврат свободных страниц файлу базы после архивации"""
+        with self.pool.maintenance() as conn:
+            # Режим auto_vacuum проверяется и меняется только вне транзакции
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                logger.info("Перевод базы в режим auto_vacuum=INCREMENTAL (полный VACUUM)")
+                conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                conn.execute('VACUUM')
+            conn.execute('PRAGMA incremental_vacuum').fetchall()
+
+    def load_persisted_user_data(self) -> List[Tuple]:
+        """Сохраненные user_data всех пользователей: (user_id, data)"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT user_id, data FROM persistence_user_data')
+            return c.fetchall()
+
+    def load_persisted_conversations(self, name: str) -> List[Tuple]:
+        """Сохраненные состояния диалога name: (conversation_key, state)"""
+        with self.pool.reader() as conn:
+            c = conn.cursor()
+            c.execute('SELECT conversation_key, state FROM persistence_conversations WHERE name = ?',
+                      (name,))
+            return c.fetchall()
+
+    def save_persisted_state(self, user_data: List[Tuple], dropped_users: List[int],
+                             conversations: List[Tuple], dropped_conversations: List[Tuple]):
+        """Запись накопленных изменений user_data и диалогов одной транзакцией
+
+        user_data - пары (user_id, data), conversations - тройки
+        (name, conversation_key, state), dropped_conversations - пары
+        (name, conversation_key) завершенных диалогов.
+        """
+        with self.pool.writer() as conn:
+            c = conn.cursor()
+            c.executemany('INSERT OR REPLACE INTO persistence_user_data (user_id, data) VALUES (?, ?)',
+                          user_data)
+            c.executemany('DELETE FROM persistence_user_data WHERE user_id = ?',
+                          [(user_id,) for user_id in dropped_users])
+            c.executemany('''INSERT OR REPLACE INTO persistence_conversations
+                             (name, conversation_key, state) VALUES (?, ?, ?)''', conversations)
+            c.executemany('DELETE FROM persistence_conversations WHERE name = ? AND conversation_key = ?',
+                          dropped_conversations)
+
+    def _allocate_store_numbers(self, c: sqlite3.Cursor, count: int) -> List[str]:
+        """Выделение номеров магазинов внутри текущей транзакции записи"""
+        if count <= 0:
+            return []
+        c.execute('''UPDATE sequences SET value = value + ?
+                     WHERE name = 'store_number'
+                     RETURNING value''', (count,))
+        last_number = c.fetchone()[0]
+        return [f"M{number:03d}" for number in range(last_number - count + 1, last_number + 1)]
+
+    def import_stores_csv(self, path: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict[str, int]:
+        """Массовый импорт магазинов из CSV
+
+        Колонки: address, store_number (необязательно, иначе номер выдается автоматически)
+        """
+        seen_numbers = set()
+        inserted = skipped = 0
+        for chunk in _iter_csv_chunks(path, chunk_size):
+            explicit, automatic = [], []
+            for line, row in chunk:
+                address = (row.get('address') or '').strip()
+                store_number = (row.get('store_number') or '').strip()
+                if not address:
+                    logger.warning(f"{path}:{line}: не указан адрес магазина")
+                elif store_number in seen_numbers:
+                    logger.warning(f"{path}:{line}: номер магазина {store_number} повторяется в файле")
+                elif store_number:
+                    seen_numbers.add(store_number)
+                    explicit.append((line, (store_number, address)))
+                    continue
+                else:
+                    automatic.append(address)
+                    continue
+                skipped += 1
+
+            with self.pool.writer() as conn:
+                c = conn.cursor()
+                # Номера, уже занятые в базе
+                numbers = [values[0] for _, values in explicit]
+                c.execute(f'''SELECT store_number FROM stores
+                              WHERE store_number IN ({','.join('?' * len(numbers))})''', numbers)
+                taken = {row[0] for row in c.fetchall()}
+                for line, values in explicit:
+                    if values[0] in taken:
+                        logger.warning(f"{path}:{line}: номер магазина {values[0]} уже занят")
+                rows = [values for _, values in explicit if values[0] not in taken]
+                # Сначала явные номера: триггер сдвигает счетчик за них, и
+                # автоматические номера ниже с ними уже не пересекутся
+                c.executemany('INSERT INTO stores (store_number, address) VALUES (?, ?)', rows)
+                c.executemany('INSERT INTO stores (store_number, address) VALUES (?, ?)',
+                              zip(self._allocate_store_numbers(c, len(automatic)), automatic))
+                inserted += len(rows) + len(automatic)
+                skipped += len(explicit) - len(rows)
+
+        self.store_catalog.bump()
+        logger.info(f"Импорт магазинов из {path}: добавлено {inserted}, пропущено {skipped}")
+        return {'inserted': inserted, 'skipped': skipped}
+
+    def import_employees_csv(self, path: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict[str, int]:
+        """Массовый импорт сотрудников из CSV
+
+        Колонки: full_name, barcode, position (необязательно), store_number (необязательно)
+        """
+        store_ids = {number: store_id for store_id, number, _ in self.get_all_stores()}
+        seen_barcodes = set()
+        inserted = skipped = 0
+
+        for chunk in _iter_csv_chunks(path, chunk_size):
+            candidates = []
+            for line, row in chunk:
+                full_name = (row.get('full_name') or '').strip()
+                barcode = (row.get('barcode') or '').strip()
+                position = (row.get('position') or '').strip() or 'Кассир Торгового Зала'
+                store_number = (row.get('store_number') or '').strip()
+
+                if not full_name or not barcode:
+                    logger.warning(f"{path}:{line}: не указаны ФИО или штрих-код")
+                elif position not in POSITIONS:
+                    logger.warning(f"{path}:{line}: неизвестная должность {position}")
+                elif barcode in seen_barcodes:
+                    logger.warning(f"{path}:{line}: штрих-код {barcode} повторяется в файле")
+                elif store_number and store_number not in store_ids:
+                    logger.warning(f"{path}:{line}: магазин {store_number} не найден")
+                else:
+                    seen_barcodes.add(barcode)
+                    # Как и в update_user_position: такие должности к магазину не привязаны
+                    if position in NON_STORE_POSITIONS and store_number:
+                        logger.warning(f"{path}:{line}: должность {position} не привязывается "
+                                       f"к магазину, {store_number} не сохранен")
+                        store_number = ''
+                    is_admin = 1 if position in ADMIN_POSITIONS else 0
+                    candidates.append((line, (full_name, barcode, position, is_admin,
+                                              store_ids.get(store_number))))
+                    continue
+                skipped += 1
+
+            with self.pool.writer() as conn:
+                c = conn.cursor()
+                # Штрих-коды, уже занятые в базе
+                barcodes = [values[1] for _, values in candidates]
+                c.execute(f'''SELECT barcode FROM users
+                              WHERE barcode IN ({','.join('?' * len(barcodes))})''', barcodes)
+                taken = {row[0] for row in c.fetchall()}
+                for line, values in candidates:
+                    if values[1] in taken:
+                        logger.warning(f"{path}:{line}: штрих-код {values[1]} уже зарегистрирован")
+                rows = [values for _, values in candidates if values[1] not in taken]
+                c.executemany('''INSERT INTO users
+                                 (full_name, barcode, position, is_admin, work_store_id)
+                                 VALUES (?, ?, ?, ?, ?)''', rows)
+                inserted += len(rows)
+                skipped += len(candidates) - len(rows)
+
+        logger.info(f"Импорт сотрудников из {path}: добавлено {inserted}, пропущено {skipped}")
+        return {'inserted': inserted, 'skipped': skipped}
+
+    def import_schedules_csv(self, path: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict[str, int]:
+        """Массовый импорт графиков из CSV
+
+        Колонки: barcode, month (ГГГГ-ММ), days (рабочие дни через запятую
+        или строка 'СВ...'), store_number (необязательно, иначе магазин сотрудника)
+        """
+        store_ids = {number: store_id for store_id, number, _ in self.get_all_stores()}
+        inserted = skipped = 0
+
+        for chunk in _iter_csv_chunks(path, chunk_size):
+            with self.pool.writer() as conn:
+                c = conn.cursor()
+                barcodes = list({(row.get('barcode') or '').strip() for _, row in chunk})
+                c.execute(f'''SELECT barcode, id, work_store_id FROM users
+                              WHERE barcode IN ({','.join('?' * len(barcodes))})''', barcodes)
+                users = {barcode: (user_id, store_id) for barcode, user_id, store_id in c.fetchall()}
+
+                rows = []
+                for line, row in chunk:
+                    barcode = (row.get('barcode') or '').strip()
+                    month = (row.get('month') or '').strip()
+                    days = (row.get('days') or '').strip()
+                    store_number = (row.get('store_number') or '').strip()
+                    try:
+                        month_date = datetime.strptime(month, '%Y-%m')
+                        days_in_month = calendar.monthrange(month_date.year, month_date.month)[1]
+                        if days and set(days) <= {WORK_DAY, DAY_OFF}:
+                            if len(days) != days_in_month:
+                                raise ValueError(f"длина графика {len(days)} вместо {days_in_month}")
+                            mask = encode_schedule(days)
+                        else:
+                            work_days = [int(day) for day in days.split(',') if day.strip()]
+                            if not all(1 <= day <= days_in_month for day in work_days):
+                                raise ValueError(f"дни должны быть от 1 до {days_in_month}")
+                            mask = mask_from_days(work_days)
+                    except ValueError as e:
+                        logger.warning(f"{path}:{line}: неверный месяц или дни ({e})")
+                        skipped += 1
+                        continue
+
+                    if barcode not in users:
+                        logger.warning(f"{path}:{line}: сотрудник со штрих-кодом {barcode} не найден")
+                        skipped += 1
+                        continue
+                    user_id, work_store_id = users[barcode]
+                    store_id = store_ids.get(store_number) if store_number else work_store_id
+                    if store_id is None:
+                        logger.warning(f"{path}:{line}: не удалось определить магазин")
+                        skipped += 1
+                        continue
+
+                    rows.append((user_id, store_id, month, decode_schedule(mask, days_in_month),
+                                 mask, days_in_month))
+
+                c.executemany('''INSERT OR REPLACE INTO schedules
+                                 (user_id, store_id, month, schedule_data, shift_mask, days_in_month)
+                                 VALUES (?, ?, ?, ?, ?, ?)''', rows)
+                inserted += len(rows)
+
+        logger.info(f"Импорт графиков из {path}: загружено {inserted}, пропущено {skipped}")
+        return {'inserted': inserted, 'skipped': skipped}
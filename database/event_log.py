@@ -0,0 +1,80 @@
+import json
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.connection_pool import ConnectionPool
+
+logger = logging.getLogger('TelegramBot')
+
+
+class EventLog:
+    """Буферизованная запись журнала изменений в таблицу events
+
+    События копятся в памяти и записываются пачкой одной транзакцией:
+    фоновым потоком раз в flush_interval секунд или сразу при заполнении
+    буфера до max_buffer событий. Запрос на изменение данных не ждет
+    записи в журнал и не добавляет собственного COMMIT.
+    """
+
+    def __init__(self, pool: ConnectionPool, flush_interval: float = 1.0, max_buffer: int = 500):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[Tuple] = []
+        self._lock = threading.Lock()
+        # Сериализует запись пачек, чтобы события ложились в журнал по порядку
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, name='db-event-log', daemon=True)
+        self._flusher.start()
+
+    def record(self, event_type: str, user_id: Optional[int] = None,
+               store_id: Optional[int] = None, details: Optional[Dict[str, Any]] = None):
+        """Добавление события в буфер"""
+        event = (
+            datetime.now().isoformat(timespec='milliseconds'),
+            event_type,
+            user_id,
+            store_id,
+            json.dumps(details, ensure_ascii=False) if details else None,
+        )
+        with self._lock:
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.max_buffer
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Запись накопленных событий одной транзакцией"""
+        with self._flush_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+            if not events:
+                return
+            try:
+                with self.pool.writer() as conn:
+                    conn.executemany('''INSERT INTO events
+                                        (created_at, event_type, user_id, store_id, details)
+                                        VALUES (?, ?, ?, ?, ?)''', events)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка записи журнала событий ({len(events)} событий): {e}")
+
+    def _flush_loop(self):
+        """Фоновая запись буфера"""
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Остановка фоновой записи и сохранение оставшихся событий"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
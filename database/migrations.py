@@ -0,0 +1,313 @@
+import sqlite3
+import logging
+from datetime import datetime
+
+from database.connection_pool import ConnectionPool
+from database.schedule_codec import encode_schedule
+
+logger = logging.getLogger('TelegramBot')
+
+
+def _add_lookup_indexes(c: sqlite3.Cursor):
+    """Индексы для частых выборок пользователей и подмен"""
+    c.execute('CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_users_work_store_id ON users(work_store_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_substitutions_user_date ON substitutions(user_id, date)')
+
+
+def _unique_schedules(c: sqlite3.Cursor):
+    """Удаление дублей графиков и уникальный ключ (user_id, store_id, month)"""
+    # INSERT OR REPLACE без уникального ключа добавлял новые строки,
+    # поэтому оставляем только последнюю сохраненную версию графика
+    c.execute('''DELETE FROM schedules
+                 WHERE id NOT IN (SELECT MAX(id)
+                                  FROM schedules
+                                  GROUP BY user_id, store_id, month)''')
+    if c.rowcount:
+        logger.info(f"Удалено дублирующихся графиков: {c.rowcount}")
+    c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_schedules_user_store_month
+                 ON schedules(user_id, store_id, month)''')
+
+
+def _schedule_shift_masks(c: sqlite3.Cursor):
+    """Компактное хранение графика: битовая маска смен и длина месяца"""
+    c.execute('ALTER TABLE schedules ADD COLUMN shift_mask INTEGER')
+    c.execute('ALTER TABLE schedules ADD COLUMN days_in_month INTEGER')
+    # Переносим данные из строковых графиков
+    c.execute('SELECT id, schedule_data FROM schedules')
+    rows = [(encode_schedule(data or ''), len(data or ''), schedule_id)
+            for schedule_id, data in c.fetchall()]
+    c.executemany('UPDATE schedules SET shift_mask = ?, days_in_month = ? WHERE id = ?', rows)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_schedules_store_month ON schedules(store_id, month)')
+
+
+
+def _search_index(c: sqlite3.Cursor):
+    """Полнотекстовый индекс (триграммы) по ФИО, штрих-кодам и адресам магазинов"""
+    # Внешнее содержимое: индекс хранит только триграммы, текст берется из таблиц
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS users_fts
+                 USING fts5(full_name, barcode, content='users', content_rowid='id',
+                            tokenize='trigram')''')
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS stores_fts
+                 USING fts5(address, content='stores', content_rowid='id',
+                            tokenize='trigram')''')
+
+    # Триггеры синхронизации индекса с таблицами
+    c.execute('''CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+                     INSERT INTO users_fts(rowid, full_name, barcode)
+                     VALUES (new.id, new.full_name, new.barcode);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+                     INSERT INTO users_fts(users_fts, rowid, full_name, barcode)
+                     VALUES ('delete', old.id, old.full_name, old.barcode);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS users_fts_update
+                 AFTER UPDATE OF full_name, barcode ON users BEGIN
+                     INSERT INTO users_fts(users_fts, rowid, full_name, barcode)
+                     VALUES ('delete', old.id, old.full_name, old.barcode);
+                     INSERT INTO users_fts(rowid, full_name, barcode)
+                     VALUES (new.id, new.full_name, new.barcode);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS stores_fts_insert AFTER INSERT ON stores BEGIN
+                     INSERT INTO stores_fts(rowid, address) VALUES (new.id, new.address);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS stores_fts_delete AFTER DELETE ON stores BEGIN
+                     INSERT INTO stores_fts(stores_fts, rowid, address)
+                     VALUES ('delete', old.id, old.address);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS stores_fts_update
+                 AFTER UPDATE OF address ON stores BEGIN
+                     INSERT INTO stores_fts(stores_fts, rowid, address)
+                     VALUES ('delete', old.id, old.address);
+                     INSERT INTO stores_fts(rowid, address) VALUES (new.id, new.address);
+                 END''')
+
+    # Короткие запросы ищутся по началу ФИО
+    c.execute('CREATE INDEX IF NOT EXISTS idx_users_full_name ON users(full_name)')
+
+    # Заполняем индекс существующими данными
+    c.execute("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+    c.execute("INSERT INTO stores_fts(stores_fts) VALUES ('rebuild')")
+
+
+def _report_indexes(c: sqlite3.Cursor):
+    """Покрывающие индексы для месячных отчетов по часам"""
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_schedules_month
+                 ON schedules(month, store_id, user_id, schedule_data)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_substitutions_date
+                 ON substitutions(date, store_id, user_id, hours)''')
+
+
+def _store_number_sequence(c: sqlite3.Cursor):
+    """Счетчик номеров магазинов вместо COUNT(*) по таблице"""
+    c.execute('''CREATE TABLE IF NOT EXISTS sequences
+                 (name TEXT PRIMARY KEY,
+                  value INTEGER NOT NULL)''')
+    c.execute('''INSERT OR IGNORE INTO sequences (name, value)
+                 SELECT 'store_number', COALESCE(MAX(CAST(substr(store_number, 2) AS INTEGER)), 0)
+                 FROM stores WHERE store_number GLOB 'M[0-9]*' ''')
+    # Номера, заданные явно (например, при импорте), сдвигают счетчик вперед
+    c.execute('''CREATE TRIGGER IF NOT EXISTS stores_number_sequence
+                 AFTER INSERT ON stores
+                 WHEN new.store_number GLOB 'M[0-9]*'
+                 BEGIN
+                     UPDATE sequences
+                     SET value = MAX(value, CAST(substr(new.store_number, 2) AS INTEGER))
+                     WHERE name = 'store_number';
+                 END''')
+
+
+def _store_headcounts(c: sqlite3.Cursor):
+    """Численность сотрудников магазинов по должностям, поддерживаемая триггерами"""
+    c.execute('''CREATE TABLE IF NOT EXISTS store_headcounts
+                 (store_id INTEGER NOT NULL,
+                  position TEXT NOT NULL,
+                  headcount INTEGER NOT NULL,
+                  PRIMARY KEY(store_id, position)) WITHOUT ROWID''')
+
+    # Прибавление и вычитание сотрудника; пустые строки удаляются
+    increment = '''INSERT INTO store_headcounts (store_id, position, headcount)
+                   VALUES (new.work_store_id, COALESCE(new.position, ''), 1)
+                   ON CONFLICT(store_id, position) DO UPDATE SET headcount = headcount + 1;'''
+    decrement = '''UPDATE store_headcounts SET headcount = headcount - 1
+                   WHERE store_id = old.work_store_id AND position = COALESCE(old.position, '');
+                   DELETE FROM store_headcounts
+                   WHERE store_id = old.work_store_id AND position = COALESCE(old.position, '')
+                   AND headcount <= 0;'''
+
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS users_headcount_insert
+                  AFTER INSERT ON users WHEN new.work_store_id IS NOT NULL
+                  BEGIN {increment} END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS users_headcount_delete
+                  AFTER DELETE ON users WHEN old.work_store_id IS NOT NULL
+                  BEGIN {decrement} END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS users_headcount_update_old
+                  AFTER UPDATE OF work_store_id, position ON users
+                  WHEN old.work_store_id IS NOT NULL
+                  AND (old.work_store_id IS NOT new.work_store_id OR old.position IS NOT new.position)
+                  BEGIN {decrement} END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS users_headcount_update_new
+                  AFTER UPDATE OF work_store_id, position ON users
+                  WHEN new.work_store_id IS NOT NULL
+                  AND (old.work_store_id IS NOT new.work_store_id OR old.position IS NOT new.position)
+                  BEGIN {increment} END''')
+
+    # Начальное заполнение по текущим данным
+    c.execute('''INSERT OR REPLACE INTO store_headcounts (store_id, position, headcount)
+                 SELECT work_store_id, COALESCE(position, ''), COUNT(*)
+                 FROM users
+                 WHERE work_store_id IS NOT NULL
+                 GROUP BY work_store_id, COALESCE(position, '')''')
+
+
+def _events_log(c: sqlite3.Cursor):
+    """Журнал изменений: только добавление записей"""
+    c.execute('''CREATE TABLE IF NOT EXISTS events
+                 (id INTEGER PRIMARY KEY,
+                  created_at TEXT NOT NULL,
+                  event_type TEXT NOT NULL,
+                  user_id INTEGER,
+                  store_id INTEGER,
+                  details TEXT)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_events_created_at ON events(created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_events_user_created_at ON events(user_id, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_events_store_created_at ON events(store_id, created_at)')
+    # Записи журнала нельзя изменить или удалить
+    for action in ('UPDATE', 'DELETE'):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS events_no_{action.lower()}
+                      BEFORE {action} ON events
+                      BEGIN SELECT RAISE(ABORT, 'events: журнал только для добавления'); END''')
+
+
+def _archive_tables(c: sqlite3.Cursor):
+    """Архивные таблицы графиков и подмен за прошедшие месяцы"""
+    c.execute('''CREATE TABLE IF NOT EXISTS schedules_archive
+                 (id INTEGER PRIMARY KEY,
+                  user_id INTEGER,
+                  store_id INTEGER,
+                  month TEXT,
+                  schedule_data TEXT,
+                  shift_mask INTEGER,
+                  days_in_month INTEGER)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_schedules_archive_user_store_month
+                 ON schedules_archive(user_id, store_id, month)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_schedules_archive_month
+                 ON schedules_archive(month, store_id)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS substitutions_archive
+                 (id INTEGER PRIMARY KEY,
+                  user_id INTEGER,
+                  store_id INTEGER,
+                  date TEXT,
+                  hours INTEGER)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_substitutions_archive_user_date
+                 ON substitutions_archive(user_id, date)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_substitutions_archive_date
+                 ON substitutions_archive(date, store_id)''')
+
+    # Представления для чтения архивных месяцев вместе с оперативными данными
+    c.execute('''CREATE VIEW IF NOT EXISTS schedules_all AS
+                 SELECT id, user_id, store_id, month, schedule_data, shift_mask, days_in_month
+                 FROM schedules
+                 UNION ALL
+                 SELECT id, user_id, store_id, month, schedule_data, shift_mask, days_in_month
+                 FROM schedules_archive''')
+    c.execute('''CREATE VIEW IF NOT EXISTS substitutions_all AS
+                 SELECT id, user_id, store_id, date, hours FROM substitutions
+                 UNION ALL
+                 SELECT id, user_id, store_id, date, hours FROM substitutions_archive''')
+
+    # Служебные значения: граница архива и т.п.
+    c.execute('''CREATE TABLE IF NOT EXISTS settings
+                 (name TEXT PRIMARY KEY,
+                  value TEXT)''')
+
+
+def _persistence_tables(c: sqlite3.Cursor):
+    """Хранение состояний диалогов и user_data между перезапусками бота"""
+    c.execute('''CREATE TABLE IF NOT EXISTS persistence_user_data
+                 (user_id INTEGER PRIMARY KEY,
+                  data BLOB NOT NULL)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS persistence_conversations
+                 (name TEXT NOT NULL,
+                  conversation_key TEXT NOT NULL,
+                  state BLOB NOT NULL,
+                  PRIMARY KEY(name, conversation_key)) WITHOUT ROWID''')
+
+
+def _stores_version(c: sqlite3.Cursor):
+    """Версия справочника магазинов, увеличиваемая триггерами при любом изменении"""
+    c.execute("INSERT OR IGNORE INTO sequences (name, value) VALUES ('stores_version', 0)")
+    bump = "UPDATE sequences SET value = value + 1 WHERE name = 'stores_version';"
+    for operation in ('INSERT', 'UPDATE', 'DELETE'):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS stores_version_{operation.lower()}
+                      AFTER {operation} ON stores
+                      BEGIN {bump} END''')
+
+
+def _stores_address_index(c: sqlite3.Cursor):
+    """Индекс для поиска магазинов по началу адреса"""
+    c.execute('CREATE INDEX IF NOT EXISTS idx_stores_address ON stores(address)')
+
+
+def _shift_mask_reports(c: sqlite3.Cursor):
+    """Отчеты считают смены по маске: маска заполнена везде, индекс покрывает ее"""
+    for table in ('schedules', 'schedules_archive'):
+        c.execute(f'SELECT id, schedule_data FROM {table} WHERE shift_mask IS NULL')
+        rows = [(encode_schedule(data or ''), len(data or ''), schedule_id)
+                for schedule_id, data in c.fetchall()]
+        c.executemany(f'UPDATE {table} SET shift_mask = ?, days_in_month = ? WHERE id = ?', rows)
+    c.execute('DROP INDEX IF EXISTS idx_schedules_month')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_schedules_month
+                 ON schedules(month, store_id, user_id, shift_mask)''')
+
+# Упорядоченный список миграций: (версия, описание, функция)
+MIGRATIONS = [
+    (1, 'Индексы пользователей и подмен', _add_lookup_indexes),
+    (2, 'Уникальные графики сотрудников', _unique_schedules),
+    (3, 'Битовые маски графиков', _schedule_shift_masks),
+    (4, 'Полнотекстовый поиск сотрудников и магазинов', _search_index),
+    (5, 'Индексы месячных отчетов', _report_indexes),
+    (6, 'Счетчик номеров магазинов', _store_number_sequence),
+    (7, 'Численность сотрудников магазинов', _store_headcounts),
+    (8, 'Журнал изменений', _events_log),
+    (9, 'Архив графиков и подмен', _archive_tables),
+    (10, 'Сохранение диалогов между перезапусками', _persistence_tables),
+    (11, 'Версия справочника магазинов', _stores_version),
+    (12, 'Индекс адресов магазинов', _stores_address_index),
+    (13, 'Подсчет смен по битовым маскам', _shift_mask_reports),
+]
+
+
+def get_schema_version(c: sqlite3.Cursor) -> int:
+    """Текущая версия схемы базы данных"""
+    c.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                 (version INTEGER PRIMARY KEY,
+                  description TEXT,
+                  applied_at TEXT)''')
+    c.execute('SELECT MAX(version) FROM schema_version')
+    version = c.fetchone()[0]
+    return version or 0
+
+
+def apply_migrations(pool: ConnectionPool) -> int:
+    """Применение всех непримененных миграций, каждая в своей транзакции"""
+    with pool.writer() as conn:
+        current_version = get_schema_version(conn.cursor())
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        with pool.writer() as conn:
+            c = conn.cursor()
+            # Другой процесс (например, import_csv.py) мог применить миграцию,
+            # пока мы ждали блокировку записи: версию перечитываем в транзакции
+            current_version = get_schema_version(c)
+            if version <= current_version:
+                continue
+            migrate(c)
+            c.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                      (version, description, datetime.now().isoformat(timespec='seconds')))
+        logger.info(f"Применена миграция {version}: {description}")
+        current_version = version
+
+    return current_version
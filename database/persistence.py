@@ -0,0 +1,142 @@
+import asyncio
+import json
+import pickle
+import sqlite3
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from database.async_db_handler import AsyncDatabaseHandler
+
+logger = logging.getLogger('TelegramBot')
+
+
+class SQLitePersistence(BasePersistence):
+    """Хранение состояний диалогов и user_data в базе бота
+
+    Application раз в update_interval секунд передает изменившиеся
+    user_data и состояния диалогов. Они только помечаются как измененные,
+    а затем записываются в базу одной транзакцией на весь цикл.
+    chat_data, bot_data и callback_data бот не использует и не сохраняет.
+    """
+
+    def __init__(self, db: AsyncDatabaseHandler, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False,
+                                        user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db = db
+        # Измененные записи: None означает удаление
+        self._dirty_users: Dict[int, Optional[dict]] = {}
+        self._dirty_conversations: Dict[Tuple[str, str], Optional[object]] = {}
+        self._write_task: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        """Загрузка user_data всех пользователей при запуске"""
+        rows = await self.db.load_persisted_user_data()
+        return {user_id: pickle.loads(data) for user_id, data in rows}
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        """Загрузка состояний диалога при запуске"""
+        rows = await self.db.load_persisted_conversations(name)
+        return {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+
+    async def update_conversation(self, name: str, key: tuple,
+                                  new_state: Optional[object]) -> None:
+        """Пометка состояния диалога как измененного"""
+        self._dirty_conversations[(name, json.dumps(list(key)))] = new_state
+        self._schedule_write()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        """Пометка user_data как измененных"""
+        self._dirty_users[user_id] = data
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        """Удаление user_data пользователя"""
+        self._dirty_users[user_id] = None
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        """Данные в памяти всегда актуальнее базы, обновлять нечего"""
+
+    def _schedule_write(self):
+        """Запуск фоновой записи, если она еще не запущена"""
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_dirty())
+
+    async def _write_dirty(self):
+        """Запись всех накопленных изменений пачками"""
+        # Даем остальным обновлениям текущего цикла попасть в ту же пачку
+        await asyncio.sleep(0)
+        async with self._write_lock:
+            while self._dirty_users or self._dirty_conversations:
+                users, self._dirty_users = self._dirty_users, {}
+                conversations, self._dirty_conversations = self._dirty_conversations, {}
+                try:
+                    await self.db.save_persisted_state(
+                        self._pickled(users),
+                        [user_id for user_id, data in users.items() if data is None],
+                        [(name, key, state) for (name, key), state in self._pickled(conversations)],
+                        [key for key, state in conversations.items() if state is None],
+                    )
+                except sqlite3.Error as e:
+                    logger.error(f"Ошибка сохранения состояний диалогов: {e}")
+                    # Возвращаем записи, которые не успели измениться заново
+                    for user_id, data in users.items():
+                        self._dirty_users.setdefault(user_id, data)
+                    for key, state in conversations.items():
+                        self._dirty_conversations.setdefault(key, state)
+                    return
+                logger.debug(f"Сохранено состояний: пользователей {len(users)}, "
+                             f"диалогов {len(conversations)}")
+
+    def _pickled(self, entries: dict) -> List[Tuple]:
+        """Сериализация измененных записей, кроме удаленных и несериализуемых"""
+        pickled = []
+        for key, value in entries.items():
+            if value is None:
+                continue
+            try:
+                pickled.append((key, pickle.dumps(value)))
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                logger.error(f"Не удалось сохранить состояние {key}: {e}")
+        return pickled
+
+    async def flush(self) -> None:
+        """Запись оставшихся изменений при остановке бота"""
+        if self._write_task is not None:
+            await self._write_task
+        await self._write_dirty()
+
+    # Данные чатов, бота и callback_data не используются
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: object) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
@@ -0,0 +1,52 @@
+from typing import Iterable, List, Optional
+
+# Обозначения дней в строковом графике
+WORK_DAY = 'С'
+DAY_OFF = 'В'
+
+
+def encode_schedule(schedule_data: str) -> int:
+    """Строка графика 'СВВС...' -> битовая маска (бит 0 - первое число)"""
+    mask = 0
+    for i, day in enumerate(schedule_data):
+        if day == WORK_DAY:
+            mask |= 1 << i
+    return mask
+
+
+def decode_schedule(mask: int, days_in_month: int) -> str:
+    """Битовая маска -> строка графика длиной days_in_month"""
+    return ''.join(
+        WORK_DAY if mask >> i & 1 else DAY_OFF
+        for i in range(days_in_month)
+    )
+
+
+def mask_from_days(work_days: Iterable[int]) -> int:
+    """Номера рабочих дней (с 1) -> битовая маска"""
+    mask = 0
+    for day in work_days:
+        mask |= 1 << (day - 1)
+    return mask
+
+
+def days_from_mask(mask: int) -> List[int]:
+    """Битовая маска -> номера рабочих дней (с 1)"""
+    days = []
+    day = 1
+    while mask:
+        if mask & 1:
+            days.append(day)
+        mask >>= 1
+        day += 1
+    return days
+
+
+def count_shifts(mask: Optional[int]) -> int:
+    """Количество смен в битовой маске"""
+    return bin(mask).count('1') if mask else 0
+
+
+def works_on(mask: int, day: int) -> bool:
+    """Есть ли смена в указанный день месяца"""
+    return bool(mask >> (day - 1) & 1)
@@ -23,7 +23,7 @@ class AdminHandler:
         
         # Проверяем, есть ли у выбранного пользователя права админа
         user_id = context.user_data.get('selected_user_id')
-        user_data = self.db.get_user_data(user_id)
+        user_data = await self.db.get_user_data(user_id)
         
         if not user_data:
             await update.message.reply_text("Ошибка: пользователь не найден")
@@ -47,13 +47,13 @@ class AdminHandler:
             return await self.show_user_management(update, context)
         
         user_id = context.user_data.get('selected_user_id')
-        user_data = self.db.get_user_data(user_id)
+        user_data = await self.db.get_user_data(user_id)
         
         if not user_data:
             await update.message.reply_text("Ошибка: пользователь не найден")
             return await self.show_admin_panel(update, context)
         
         # Убираем права админа
-        self.db.set_admin_status(user_id, False)
+        await self.db.set_admin_status(user_id, False)
         await update.message.reply_text("Права администратора успешно удалены")
         return await self.show_user_management(update, context)
\ No newline at end of file
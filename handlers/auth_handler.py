@@ -1,13 +1,18 @@
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from database.db_handler import DatabaseHandler
-from config.config import DATABASE_NAME
+from database.async_db_handler import AsyncDatabaseHandler
+from database.schedule_codec import mask_from_days, decode_schedule, WORK_DAY
+from utils.coverage import compute_coverage
+from utils.rate_limiter import PRIORITY_BULK
+from config.config import DATABASE_NAME, MIN_STAFF_PER_DAY, SHIFT_HOURS
 from utils.states import *
 from handlers.common_handler import start
 import logging
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 import calendar
+from typing import Optional
 
 logger = logging.getLogger('TelegramBot')
 
@@ -21,9 +26,14 @@ POSITIONS = {
     "5": "Служба Безопасности"
 }
 
+# Постраничный вывод списков сотрудников и администраторов
+USERS_PAGE_SIZE = 20
+PREV_PAGE = '⬅️ Предыдущая'
+NEXT_PAGE = '➡️ Далее'
+
 class AuthHandler:
-    def __init__(self):
-        self.db = DatabaseHandler(DATABASE_NAME)
+    def __init__(self, db: Optional[AsyncDatabaseHandler] = None):
+        self.db = db or AsyncDatabaseHandler(DatabaseHandler(DATABASE_NAME))
         logger.info("AuthHandler инициализирован")
 
     def calculate_experience(self, hire_date_str: str) -> str:
@@ -82,9 +92,10 @@ class AuthHandler:
         
         # Добавляем информацию о прикрепленных магазинах только для Администраторов
         if position == "Администратор":
-            admin_stores = self.db.get_admin_stores(user_id)
+            admins = await self.db.get_administrators_with_stores(admin_id=user_id)
+            admin_stores = admins[0][2] if admins else []
             if admin_stores:
-                stores_text = ", ".join([store[2] for store in admin_stores])
+                stores_text = ", ".join([address for _, address in admin_stores])
                 profile_text.append(f"Прикрепленные магазины: {stores_text}")
             else:
                 profile_text.append("Прикрепленные магазины: Не назначены")
@@ -94,7 +105,7 @@ class AuthHandler:
     async def show_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать главное меню"""
         user_id = context.user_data.get('user_id')
-        user_data = self.db.get_user_data(user_id)
+        user_data = await self.db.get_user_data(user_id)
         
         if not user_data:
             await update.message.reply_text("Ошибка: данные пользователя не найдены")
@@ -132,7 +143,7 @@ class AuthHandler:
     async def show_edit_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать меню редктирования профиля"""
         user_id = context.user_data.get('user_id')
-        user_data = self.db.get_user_data(user_id)
+        user_data = await self.db.get_user_data(user_id)
         
         if not user_data:
             await update.message.reply_text("Ошибка: данные пользователя не найдены")
@@ -176,7 +187,7 @@ class AuthHandler:
 
         new_name = update.message.text
         user_id = context.user_data.get('user_id')
-        self.db.update_user_name(user_id, new_name)
+        await self.db.update_user_name(user_id, new_name)
         
         return await self.show_menu(update, context)
 
@@ -198,12 +209,12 @@ class AuthHandler:
         user_id = context.user_data.get('user_id')
         
         # Проверяем, не занят ли штрих-код другим пользователем
-        existing_user = self.db.get_user_by_barcode(new_barcode)
+        existing_user = await self.db.get_user_by_barcode(new_barcode)
         if existing_user and existing_user[0] != user_id:
             await update.message.reply_text('Этот штрих-код уже испоеся другим пользователем!')
             return await self.edit_barcode(update, context)
 
-        self.db.update_user_barcode(user_id, new_barcode)
+        await self.db.update_user_barcode(user_id, new_barcode)
         return await self.show_menu(update, context)
 
     async def register(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -237,7 +248,7 @@ class AuthHandler:
         logger.debug(f"Получен штрих-код: {barcode}")
         
         # Проверяем, существует ли штрих-код в базе
-        existing_user = self.db.get_user_by_barcode(barcode)
+        existing_user = await self.db.get_user_by_barcode(barcode)
         if existing_user:
             reply_keyboard = [['🔐 Регистрация', '🔑 Авторизация']]
             await update.message.reply_text(
@@ -266,7 +277,7 @@ class AuthHandler:
             return await self.authorize(update, context)
         
         barcode = update.message.text
-        user_data = self.db.get_user_by_barcode(barcode)
+        user_data = await self.db.get_user_by_barcode(barcode)
         
         if not user_data:
             await update.message.reply_text(
@@ -280,12 +291,12 @@ class AuthHandler:
         context.user_data['user_id'] = user_id
         
         # Получаем полные данные пользователя
-        full_user_data = self.db.get_user_data(user_id)
+        full_user_data = await self.db.get_user_data(user_id)
         if full_user_data:
             _, _, _, position, is_admin, _, _ = full_user_data
             # Если пользоатель Территориальный менеджер, автоматически даем права админа
             if position == 'Территориальный менеджер':
-                self.db.set_admin_status(user_id, True)
+                await self.db.set_admin_status(user_id, True)
         
         return await self.show_menu(update, context)
 
@@ -310,7 +321,7 @@ class AuthHandler:
             datetime.strptime(hire_date, '%d.%m.%Y')
             
             user_id = context.user_data.get('user_id')
-            self.db.update_hire_date(user_id, hire_date)
+            await self.db.update_hire_date(user_id, hire_date)
             
             return await self.show_menu(update, context)
         except ValueError:
@@ -336,7 +347,7 @@ class AuthHandler:
             
         if update.message.text == ADMIN_SECRET_CODE:
             user_id = context.user_data.get('user_id')
-            self.db.set_admin_status(user_id, True)
+            await self.db.set_admin_status(user_id, True)
             
             await update.message.reply_text(
                 '🎉 Поздравляем! Вы получили права администратоа!'
@@ -355,6 +366,8 @@ class AuthHandler:
             ['👥 Управление сотрудниками'],
             ['🏪 Управление магазинами'],
             ['👨‍💼 Управление администраторами'],
+            ['📊 Покрытие смен'],
+            ['⏱ Часы по магазинам'],
             ['↩️ Назад']
         ]
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
@@ -364,21 +377,147 @@ class AuthHandler:
         )
         return ADMIN_MENU
 
+    async def show_coverage_report(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Показать покрытие смен по всем магазинам за текущий месяц"""
+        now = datetime.now()
+        current_month = now.strftime('%Y-%m')
+        days_in_month = calendar.monthrange(now.year, now.month)[1]
+
+        stores = await self.db.get_all_stores()
+        if not stores:
+            await update.message.reply_text("В базе нет магазинов.")
+            return ADMIN_MENU
+
+        shift_masks = await self.db.get_month_shift_masks(current_month)
+        substitution_days = await self.db.get_month_substitution_days(current_month)
+        report = compute_coverage(
+            [store[0] for store in stores], shift_masks, substitution_days,
+            days_in_month, MIN_STAFF_PER_DAY
+        )
+
+        lines = [f"📊 Покрытие смен на {now.strftime('%m.%Y')} (минимум {MIN_STAFF_PER_DAY} чел.):\n"]
+        for i, (store_id, store_number, address) in enumerate(stores):
+            short_days = [str(day + 1) for day in report.understaffed[i].nonzero()[0]]
+            lines.append(
+                f"🏪 {store_number} ({address}): смен {report.totals[i]}, "
+                f"в среднем {report.headcount[i].mean():.1f} чел./день"
+            )
+            if short_days:
+                lines.append(f"   ⚠️ Не хватает людей: {', '.join(short_days)}")
+
+        await self._send_bulk(update, context, "\n".join(lines))
+        return ADMIN_MENU
+
+    async def show_hours_report(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Показать отработанные часы по всем магазинам за текущий месяц"""
+        now = datetime.now()
+        totals = await self.db.get_store_month_totals(now.strftime('%Y-%m'))
+        if not totals:
+            await update.message.reply_text("В базе нет магазинов.")
+            return ADMIN_MENU
+
+        lines = [f"⏱ Часы по магазинам за {now.strftime('%m.%Y')} (смена = {SHIFT_HOURS} ч):\n"]
+        total_hours = 0
+        for store_id, store_number, address, employees, shifts, substitution_hours in totals:
+            store_hours = shifts * SHIFT_HOURS + substitution_hours
+            total_hours += store_hours
+            lines.append(
+                f"🏪 {store_number} ({address}): {store_hours} ч — "
+                f"сотрудников {employees}, смен {shifts}, подмены {substitution_hours} ч"
+            )
+        lines.append(f"\nВсего: {total_hours} ч")
+
+        await self._send_bulk(update, context, "\n".join(lines))
+        return ADMIN_MENU
+
     async def show_users_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать список пользователей"""
         if update.message.text == '↩️ Назад':
             return await self.show_menu(update, context)
 
-        users = self.db.get_all_users()
-        users_list = ""
-        for i, user in enumerate(users, 1):
-            users_list += f"{i}. {user[1]} ({user[5]})\n"
+        return await self._send_users_page(update, context, after_id=0, cursors=[])
+
+    async def _send_bulk(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                         reply_markup: Optional[ReplyKeyboardMarkup] = None):
+        """Отправка длинного текста частями по 4096 символов с низким приоритетом
+
+        Message.reply_text не принимает rate_limit_args, поэтому части
+        отправляются через context.bot.send_message.
+        """
+        for x in range(0, len(text), 4096):
+            await context.bot.send_message(
+                update.effective_chat.id,
+                text[x:x+4096],
+                reply_markup=reply_markup,
+                rate_limit_args=PRIORITY_BULK
+            )
+
+    async def _load_users_page(self, context: ContextTypes.DEFAULT_TYPE, key: str,
+                               filters: Optional[dict], after_id: int, cursors: list):
+        """Загрузка страницы пользователей и сохранение курсора в сессии"""
+        rows, has_more = await self.db.get_users_page(after_id, USERS_PAGE_SIZE, filters)
+        self._save_page(context, key, rows, after_id, cursors, has_more)
+        return rows
+
+    def _save_page(self, context: ContextTypes.DEFAULT_TYPE, key: str, rows: list,
+                   after_id: int, cursors: list, has_more: bool):
+        """Сохранение курсора страницы в сессии
+
+        В user_data хранятся только id пользователей текущей страницы
+        и стек курсоров предыдущих страниц.
+        """
+        context.user_data[key] = {
+            'ids': [row[0] for row in rows],
+            'after_id': after_id,
+            'cursors': cursors,
+            'has_more': has_more,
+        }
+
+    def _page_cursor(self, context: ContextTypes.DEFAULT_TYPE, key: str, text: str):
+        """Курсор страницы для кнопок навигации или None, если это не навигация"""
+        page = context.user_data.get(key)
+        if not page:
+            return None
+        if text == NEXT_PAGE and page['has_more'] and page['ids']:
+            return page['ids'][-1], page['cursors'] + [page['after_id']]
+        if text == PREV_PAGE and page['cursors']:
+            return page['cursors'][-1], page['cursors'][:-1]
+        return None
+
+    def _page_keyboard(self, context: ContextTypes.DEFAULT_TYPE, key: str) -> ReplyKeyboardMarkup:
+        """Клавиатура с кнопками переключения страниц"""
+        page = context.user_data[key]
+        navigation = []
+        if page['cursors']:
+            navigation.append(PREV_PAGE)
+        if page['has_more']:
+            navigation.append(NEXT_PAGE)
+        keyboard = [navigation] if navigation else []
+        keyboard.append(['↩️ Назад'])
+        return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+    def _selected_page_id(self, context: ContextTypes.DEFAULT_TYPE, key: str, text: str) -> Optional[int]:
+        """id пользователя по номеру на текущей странице"""
+        ids = context.user_data.get(key, {}).get('ids', [])
+        selected_index = int(text) - 1
+        if 0 <= selected_index < len(ids):
+            return ids[selected_index]
+        return None
+
+    async def _send_users_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                               after_id: int, cursors: list):
+        """Вывод страницы списка сотрудников"""
+        users = await self._load_users_page(context, 'users_page', None, after_id, cursors)
+        users_list = "\n".join(
+            f"{i}. {user[1]} ({user[5]})" for i, user in enumerate(users, 1)
+        )
 
         await update.message.reply_text(
-            f"Список сотрудников:\n\n{users_list}\n"
-            "Введите номер сотрудника для редактирования:"
+            f"Список сотрудников (страница {len(cursors) + 1}):\n\n{users_list}\n\n"
+            "Введите номер сотрудника для редактирования\n"
+            "или часть ФИО / штрих-кода для поиска:",
+            reply_markup=self._page_keyboard(context, 'users_page')
         )
-        context.user_data['users_list'] = users
         return SELECT_USER
 
     async def handle_user_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -386,21 +525,52 @@ class AuthHandler:
         if update.message.text == '↩️ Назад':
             return await self.show_admin_panel(update, context)
 
+        cursor = self._page_cursor(context, 'users_page', update.message.text)
+        if cursor:
+            return await self._send_users_page(update, context, *cursor)
+
         try:
-            selected_index = int(update.message.text) - 1
-            users_list = context.user_data.get('users_list', [])
+            user_id = self._selected_page_id(context, 'users_page', update.message.text)
             
-            if 0 <= selected_index < len(users_list):
-                selected_user = users_list[selected_index]
-                context.user_data['selected_user_id'] = selected_user[0]
+            if user_id is not None:
+                context.user_data['selected_user_id'] = user_id
                 return await self.show_user_management(update, context)
-            else:
+            elif len(update.message.text) < 3:
                 await update.message.reply_text("Неверный номер сотрудника. Попробуйте еще раз:")
                 return SELECT_USER
         except ValueError:
-            await update.message.reply_text("Пжалуйста, введите число.")
+            pass
+
+        # Не номер из списка - ищем по ФИО или штрих-коду
+        return await self._send_user_search(update, context, update.message.text)
+
+    async def _send_user_search(self, update: Update, context: ContextTypes.DEFAULT_TYPE, query: str):
+        """Вывод результатов поиска сотрудников"""
+        users = await self.db.search_users(query, USERS_PAGE_SIZE)
+        if not users:
+            await update.message.reply_text(
+                f"По запросу «{query}» никого не найдено.\n"
+                "Введите номер сотрудника из списка или часть ФИО / штрих-кода:"
+            )
             return SELECT_USER
 
+        # Результаты поиска становятся текущей страницей списка
+        context.user_data['users_page'] = {
+            'ids': [user[0] for user in users],
+            'after_id': 0,
+            'cursors': [],
+            'has_more': False,
+        }
+        users_list = "\n".join(
+            f"{i}. {user[1]} ({user[3]}, {user[2]})" for i, user in enumerate(users, 1)
+        )
+        await update.message.reply_text(
+            f"Найдено по запросу «{query}»:\n\n{users_list}\n\n"
+            "Введите номер сотрудника для редактирования:",
+            reply_markup=self._page_keyboard(context, 'users_page')
+        )
+        return SELECT_USER
+
     async def handle_position_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка выбора должности"""
         if update.message.text == '↩️ Назад':
@@ -412,7 +582,7 @@ class AuthHandler:
             new_position = POSITIONS[position_number]
             
             # Обновляем должность (все права и статусы обновляются внутри метода)
-            self.db.update_user_position(user_id, new_position)
+            await self.db.update_user_position(user_id, new_position)
             
             await update.message.reply_text(
                 f"Должность успешно обновлена на: {new_position}"
@@ -444,11 +614,11 @@ class AuthHandler:
             return await start(update, context)
         
         address = update.message.text
-        store_id = self.db.add_store(address)
+        store_id = await self.db.add_store(address)
         
         if store_id:
-            store = self.db.get_store_by_id(store_id)
-            employees_count = self.db.get_store_employees_count(store_id)
+            store = await self.db.get_store_by_id(store_id)
+            employees_count = await self.db.get_store_employees_count(store_id)
             
             profile_text = (
                 f"✅ Магазин успешно создан!\n\n"
@@ -472,19 +642,28 @@ class AuthHandler:
 
     async def show_administrators(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать список администраторов"""
-        admins = self.db.get_administrators()
-        admins_list = ""
-        for i, admin in enumerate(admins, 1):
-            admin_id, name = admin
-            stores = self.db.get_admin_stores(admin_id)
-            stores_text = ", ".join([store[1] for store in stores]) if stores else "Не назначены"
-            admins_list += f"{i}. {name} (Магазины: {stores_text})\n"
+        return await self._send_admins_page(update, context, after_id=0, cursors=[])
+
+    async def _send_admins_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                after_id: int, cursors: list):
+        """Вывод страницы списка администраторов"""
+        # Администраторы страницы вместе с магазинами - один запрос
+        admins = await self.db.get_administrators_with_stores(after_id, USERS_PAGE_SIZE + 1)
+        has_more = len(admins) > USERS_PAGE_SIZE
+        admins = admins[:USERS_PAGE_SIZE]
+        self._save_page(context, 'admins_page', admins, after_id, cursors, has_more)
+
+        lines = []
+        for i, (admin_id, name, stores) in enumerate(admins, 1):
+            stores_text = ", ".join([number for number, _ in stores]) if stores else "Не назначены"
+            lines.append(f"{i}. {name} (Магазины: {stores_text})")
+        admins_list = "\n".join(lines)
 
         await update.message.reply_text(
-            f"Список администраоров:\n\n{admins_list}\n"
-            "Введите номер администратора для управления:"
+            f"Список администраоров (страница {len(cursors) + 1}):\n\n{admins_list}\n\n"
+            "Введите номер администратора для управления:",
+            reply_markup=self._page_keyboard(context, 'admins_page')
         )
-        context.user_data['admins_list'] = admins
         return SELECT_ADMIN
 
     async def handle_admin_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -492,17 +671,20 @@ class AuthHandler:
         if update.message.text == '↩️ Назад':
             return await self.show_admin_panel(update, context)
 
+        cursor = self._page_cursor(context, 'admins_page', update.message.text)
+        if cursor:
+            return await self._send_admins_page(update, context, *cursor)
+
         try:
-            selected_index = int(update.message.text) - 1
-            admins_list = context.user_data.get('admins_list', [])
+            admin_id = self._selected_page_id(context, 'admins_page', update.message.text)
             
-            if 0 <= selected_index < len(admins_list):
-                selected_admin = admins_list[selected_index]
-                context.user_data['selected_admin_id'] = selected_admin[0]
+            if admin_id is not None:
+                context.user_data['selected_admin_id'] = admin_id
+                admin = await self.db.get_user_data(admin_id)
                 
                 keyboard = [['🏪 Прикрепить магазины'], ['↩️ Назад']]
                 await update.message.reply_text(
-                    f"Выбран администратор: {selected_admin[1]}\n"
+                    f"Выбран администратор: {admin[0] if admin else admin_id}\n"
                     "Выберите действие:",
                     reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
                 )
@@ -516,8 +698,7 @@ class AuthHandler:
 
     async def show_stores_for_assignment(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать список магазинов для прикрепления"""
-        stores = self.db.get_all_stores()
-        stores_list = "\n".join([f"{store[0]}. {store[2]}" for store in stores])
+        stores_list = await self.db.get_stores_text('{id}. {address}')
         
         await update.message.reply_text(
             f"Список магазинов:\n\n{stores_list}\n\n"
@@ -534,7 +715,7 @@ class AuthHandler:
             store_ids = [int(x.strip()) for x in update.message.text.split(',')]
             admin_id = context.user_data['selected_admin_id']
             
-            self.db.assign_stores_to_admin(admin_id, store_ids)
+            await self.db.assign_stores_to_admin(admin_id, store_ids)
             await update.message.reply_text("Магазины успешно прикреплены к администратору!")
             return await self.show_admin_panel(update, context)
         except ValueError:
@@ -544,18 +725,17 @@ class AuthHandler:
 
     async def show_stores_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать список магазинов"""
-        stores = self.db.get_all_stores()
+        stores_list = await self.db.get_stores_text('{id}. {address}')
         
-        if not stores:
+        if not stores_list:
             # Если магазинов нет, пропускаем выбор магазина
             return await self.handle_store_selection(update, context)
         
-        stores_list = "\n".join([f"{store[0]}. {store[2]}" for store in stores])
         keyboard = [['⏩ Пропустить'], ['↩️ Назад']]
         
         await update.message.reply_text(
             f"Выберите магазин из списка:\n\n{stores_list}\n\n"
-            "Введите номер магазина или нажмите 'Пропустить':",
+            "Введите номер магазина, часть адреса для поиска или нажмите 'Пропустить':",
             reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
         )
         return SELECT_STORE
@@ -571,30 +751,28 @@ class AuthHandler:
         if update and update.message and update.message.text != '⏩ Пропустить':
             try:
                 store_id = int(update.message.text)
-                store = self.db.get_store_by_id(store_id)
+                store = await self.db.get_store_by_id(store_id)
                 if not store:
                     await update.message.reply_text(
                         "Маазин с таким номером не найден. Попробуйте еще раз:"
                     )
                     return SELECT_STORE
             except ValueError:
-                await update.message.reply_text(
-                    "Пожалуйста, введите номер магазина цифрами."
-                )
-                return SELECT_STORE
+                # Не номер - ищем магазин по адресу
+                return await self._send_store_search(update, update.message.text, SELECT_STORE)
 
         # Проверяем, существует ли уже пользователь
         user_id = context.user_data.get('user_id')
         if user_id:
             # Обновляем магазин существующего пользователя
-            self.db.update_user_store(user_id, store_id)
+            await self.db.update_user_store(user_id, store_id)
             return await self.show_menu(update, context)
         else:
             # Создаем нового пользователя (регистрация)
             full_name = context.user_data.get('full_name')
             barcode = context.user_data.get('barcode')
             
-            user_id = self.db.add_user(
+            user_id = await self.db.add_user(
                 telegram_id=update.message.from_user.id,
                 full_name=full_name,
                 barcode=barcode,
@@ -619,6 +797,23 @@ class AuthHandler:
             )
             return MENU
 
+    async def _send_store_search(self, update: Update, query: str, state: int):
+        """Вывод результатов поиска магазинов с возвратом в state"""
+        stores = await self.db.search_stores(query)
+        if not stores:
+            await update.message.reply_text(
+                f"Магазины по запросу «{query}» не найдены.\n"
+                "Введите номер магазина или часть адреса:"
+            )
+            return state
+
+        stores_list = "\n".join(f"{store[0]}. {store[1]} ({store[2]})" for store in stores)
+        await update.message.reply_text(
+            f"Найдено по запросу «{query}»:\n\n{stores_list}\n\n"
+            "Введите номер магазина:"
+        )
+        return state
+
     async def show_stores_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать меню управления магазинами"""
         keyboard = [
@@ -636,12 +831,11 @@ class AuthHandler:
 
     async def delete_store_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало процесса удаления магазина"""
-        stores = self.db.get_all_stores()
-        if not stores:
+        stores_list = await self.db.get_stores_text('{id}. {number}')
+        if not stores_list:
             await update.message.reply_text("В базе нет магазинов.")
             return await self.show_stores_menu(update, context)
 
-        stores_list = "\n".join([f"{store[0]}. {store[1]}" for store in stores])
         keyboard = [['↩️ Назад']]
         await update.message.reply_text(
             f"Список магазинов:\n\n{stores_list}\n\n"
@@ -657,9 +851,9 @@ class AuthHandler:
 
         try:
             store_id = int(update.message.text)
-            store = self.db.get_store_by_id(store_id)
+            store = await self.db.get_store_by_id(store_id)
             if store:
-                self.db.delete_store(store_id)
+                await self.db.delete_store(store_id)
                 await update.message.reply_text("Магазин успешно удален!")
             else:
                 await update.message.reply_text("Магазин с таким номером не найден.")
@@ -670,12 +864,11 @@ class AuthHandler:
 
     async def show_store_employees(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать список магазинов для просмотра сотрудников"""
-        stores = self.db.get_all_stores()
-        if not stores:
+        stores_list = await self.db.get_stores_text('{id}. {address}')
+        if not stores_list:
             await update.message.reply_text("В базе нет магазинов.")
             return await self.show_stores_menu(update, context)
 
-        stores_list = "\n".join([f"{store[0]}. {store[2]}" for store in stores])
         keyboard = [['↩️ Назад']]
         await update.message.reply_text(
             f"Выберите магазин для просмотра сотрудников:\n\n{stores_list}\n\n"
@@ -691,12 +884,12 @@ class AuthHandler:
 
         try:
             store_id = int(update.message.text)
-            store = self.db.get_store_by_id(store_id)
+            store = await self.db.get_store_by_id(store_id)
             if not store:
                 await update.message.reply_text("Магазин с таким номером не найден.")
                 return await self.show_stores_menu(update, context)
 
-            employees = self.db.get_store_employees(store_id)
+            employees = await self.db.get_store_employees(store_id)
             if not employees:
                 await update.message.reply_text(f"В маазине {store[1]} нет сотрудников.")
                 return await self.show_stores_menu(update, context)
@@ -708,7 +901,7 @@ class AuthHandler:
             keyboard = [['↩️ Назад']]
             await update.message.reply_text(
                 f"Сотрудники магазина {store[1]}:\n\n{employees_list}\n\n"
-                "Выберите номе сотрудника:",
+                "Выберите номе сотрудника (можно несколько через запятую или 'все'):",
                 reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
             )
             return SELECT_EMPLOYEE
@@ -723,19 +916,29 @@ class AuthHandler:
 
         try:
             employees = context.user_data.get('store_employees', [])
-            selected_index = int(update.message.text) - 1
+            if update.message.text.strip().lower() == 'все':
+                selected_indexes = list(range(len(employees)))
+            else:
+                # Номера через запятую, без повторов
+                selected_indexes = list(dict.fromkeys(
+                    int(x.strip()) - 1 for x in update.message.text.split(',')
+                ))
 
-            if 0 <= selected_index < len(employees):
-                employee = employees[selected_index]
-                context.user_data['selected_employee_id'] = employee[0]
+            if selected_indexes and all(0 <= i < len(employees) for i in selected_indexes):
+                selected = [employees[i] for i in selected_indexes]
+                context.user_data['selected_employee_ids'] = [employee[0] for employee in selected]
 
                 keyboard = [
                     ['❌ Удалить сотрудника'],
                     ['🏪 Указать магазин'],
                     ['↩️ Назад']
                 ]
+                if len(selected) == 1:
+                    selected_text = f"Выбран сотрудник: {selected[0][1]}"
+                else:
+                    selected_text = f"Выбрано сотрудников: {len(selected)}"
                 await update.message.reply_text(
-                    f"Выбран сотрудник: {employee[1]}\n"
+                    f"{selected_text}\n"
                     "Выберите действие:",
                     reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
                 )
@@ -752,16 +955,25 @@ class AuthHandler:
         if update.message.text == '↩️ Назад':
             return await self.show_employees_list(update, context)
 
-        employee_id = context.user_data.get('selected_employee_id')
-        if not employee_id:
+        employee_ids = context.user_data.get('selected_employee_ids')
+        if not employee_ids:
             await update.message.reply_text("Ошибка: сотрудник не выбран.")
             return await self.show_stores_menu(update, context)
 
+        if len(employee_ids) > 1:
+            # Обнуляем магазин у всех выбранных сотрудников одной транзакцией
+            await self.db.reassign_employees(employee_ids, None)
+            await update.message.reply_text(
+                f"Удалено из магазина сотрудников: {len(employee_ids)}"
+            )
+            return await self.show_stores_menu(update, context)
+
         # Получаем информацию о сотруднике пере удалением
-        employee = self.db.get_user_data(employee_id)
+        employee_id = employee_ids[0]
+        employee = await self.db.get_user_data(employee_id)
         if employee:
             # Обнуляем магазин у сотрудника
-            self.db.update_user_store(employee_id, None)
+            await self.db.update_user_store(employee_id, None)
             await update.message.reply_text(
                 f"Сотрудник {employee[0]} удален из магазна."
             )
@@ -770,36 +982,48 @@ class AuthHandler:
 
         return await self.show_stores_menu(update, context)
 
+    async def show_transfer_stores(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Показать список магазинов для перевода выбранных сотрудников"""
+        stores_list = await self.db.get_stores_text('{id}. {address}')
+        if not stores_list:
+            await update.message.reply_text("В базе нет магазинов.")
+            return await self.show_stores_menu(update, context)
+
+        await update.message.reply_text(
+            f"Выберите магазин для перевода:\n\n{stores_list}\n\n"
+            "Введите номер магазина или часть адреса для поиска:",
+            reply_markup=ReplyKeyboardMarkup([['↩️ Назад']], resize_keyboard=True)
+        )
+        return TRANSFER_STORE
+
     async def reassign_employee_store(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Именение магазина сотрудника"""
+        """Именение магазина выбранных сотрудников"""
         if update.message.text == '↩️ Назад':
-            return await self.handle_employee_selection(update, context)
+            return await self.show_store_employees(update, context)
 
         try:
             store_id = int(update.message.text)
-            employee_id = context.user_data.get('selected_employee_id')
+            employee_ids = context.user_data.get('selected_employee_ids')
             
-            if not employee_id:
+            if not employee_ids:
                 await update.message.reply_text("Ошибка: сотрудник не выбран.")
                 return await self.show_stores_menu(update, context)
 
-            store = self.db.get_store_by_id(store_id)
+            store = await self.db.get_store_by_id(store_id)
             if not store:
                 await update.message.reply_text("Магазин с таким номером не найден.")
-                return SELECT_STORE
+                return TRANSFER_STORE
 
-            # Обновляем магазин сотрудика
-            self.db.update_user_store(employee_id, store_id)
+            # Переводим всех выбранных сотрудников одной транзакцией
+            await self.db.reassign_employees(employee_ids, store_id)
             await update.message.reply_text(
-                f"Магазин сотрудника успешно изменен на: {store[1]}"
+                f"Магазин сотрудников ({len(employee_ids)}) успешно изменен на: {store[1]}"
             )
             return await self.show_stores_menu(update, context)
 
         except ValueError:
-            await update.message.reply_text(
-                "Пожалуйста, введите номер магазина цифрами."
-            )
-            return SELECT_STORE
+            # Не номер - ищем магазин по адресу
+            return await self._send_store_search(update, update.message.text, TRANSFER_STORE)
 
     async def request_admin_rights(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Запрос на получение прав администратора"""
@@ -807,13 +1031,12 @@ class AuthHandler:
 
     async def show_stores_for_edit(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать список магазинов для редактирования профиля"""
-        stores = self.db.get_all_stores()
+        stores_list = await self.db.get_stores_text('{id}. {address}')
         
-        if not stores:
+        if not stores_list:
             await update.message.reply_text("В базе пока нет магазинов.")
             return await self.show_edit_menu(update, context)
         
-        stores_list = "\n".join([f"{store[0]}. {store[2]}" for store in stores])
         keyboard = [['↩️ Назад']]
         
         await update.message.reply_text(
@@ -830,7 +1053,7 @@ class AuthHandler:
 
         try:
             store_id = int(update.message.text)
-            store = self.db.get_store_by_id(store_id)
+            store = await self.db.get_store_by_id(store_id)
             if not store:
                 await update.message.reply_text(
                     "Магазин с таким номером не найден. Попробуйте еще раз:"
@@ -838,7 +1061,7 @@ class AuthHandler:
                 return EDIT_STORE
 
             user_id = context.user_data.get('user_id')
-            self.db.update_user_store(user_id, store_id)
+            await self.db.update_user_store(user_id, store_id)
             return await self.show_menu(update, context)
 
         except ValueError:
@@ -849,13 +1072,12 @@ class AuthHandler:
 
     async def edit_store(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начать процесс изменения магазина"""
-        stores = self.db.get_all_stores()
+        stores_list = await self.db.get_stores_text('{id}. {address}')
         
-        if not stores:
+        if not stores_list:
             await update.message.reply_text("В базе нет магазинов.")
             return await self.show_edit_menu(update, context)
         
-        stores_list = "\n".join([f"{store[0]}. {store[2]}" for store in stores])
         keyboard = [['↩️ Назад']]
         
         await update.message.reply_text(
@@ -872,7 +1094,7 @@ class AuthHandler:
 
         try:
             store_id = int(update.message.text)
-            store = self.db.get_store_by_id(store_id)
+            store = await self.db.get_store_by_id(store_id)
             if not store:
                 await update.message.reply_text(
                     "Магазин с таким номером не найден. Попробуйте еще раз:"
@@ -880,7 +1102,7 @@ class AuthHandler:
                 return EDIT_STORE
 
             user_id = context.user_data.get('user_id')
-            self.db.update_user_store(user_id, store_id)
+            await self.db.update_user_store(user_id, store_id)
             return await self.show_menu(update, context)
 
         except ValueError:
@@ -899,7 +1121,7 @@ class AuthHandler:
         ]
         
         user_id = context.user_data.get('selected_user_id')
-        user_data = self.db.get_user_data(user_id)
+        user_data = await self.db.get_user_data(user_id)
         
         if not user_data:
             await update.message.reply_text("Ошибка: пользователь не найден")
@@ -934,15 +1156,14 @@ class AuthHandler:
         if update.message.text == '↩️ Назад':
             return await self.show_user_management(update, context)
         
-        stores = self.db.get_all_stores()
-        if not stores:
+        stores_list = await self.db.get_stores_text('{id}. {address}')
+        if not stores_list:
             await update.message.reply_text("В базе нет магазинов")
             return await self.show_user_management(update, context)
         
-        stores_list = "\n".join([f"{store[0]}. {store[2]}" for store in stores])
         await update.message.reply_text(
             f"Выберите магазин из списка:\n\n{stores_list}\n\n"
-            "Введите номер магазина:",
+            "Введите номер магазина или часть адреса для поиска:",
             reply_markup=ReplyKeyboardMarkup([['↩️ Назад']], resize_keyboard=True)
         )
         return SELECT_STORE
@@ -953,7 +1174,7 @@ class AuthHandler:
             return await self.show_user_management(update, context)
         
         user_id = context.user_data.get('selected_user_id')
-        user_data = self.db.get_user_data(user_id)
+        user_data = await self.db.get_user_data(user_id)
         
         if not user_data:
             await update.message.reply_text("Ошибка: пользователь не найден")
@@ -970,7 +1191,7 @@ class AuthHandler:
             return await self.show_user_management(update, context)
         
         # Убираем права админа
-        self.db.set_admin_status(user_id, False)
+        await self.db.set_admin_status(user_id, False)
         await update.message.reply_text("✅ Права администратора успешно удалены")
         return await self.show_user_management(update, context)
 
@@ -989,7 +1210,7 @@ class AuthHandler:
         
         try:
             store_id = int(update.message.text)
-            store = self.db.get_store_by_id(store_id)
+            store = await self.db.get_store_by_id(store_id)
             
             if not store:
                 await update.message.reply_text(
@@ -998,7 +1219,7 @@ class AuthHandler:
                 return STORE_AUTH
             
             store_id, store_number, address = store
-            employees_count = self.db.get_store_employees_count(store_id)
+            employees_count = await self.db.get_store_employees_count(store_id)
             
             profile_text = (
                 f"🏪 Профил�� магазина:\n"
@@ -1042,7 +1263,7 @@ class AuthHandler:
             return await self.show_schedule_menu(update, context)
         
         user_id = context.user_data.get('user_id')
-        user_data = self.db.get_user_data(user_id)
+        user_data = await self.db.get_user_data(user_id)
         
         if not user_data:
             await update.message.reply_text("Ошибка: данные пользователя не найдены")
@@ -1051,44 +1272,49 @@ class AuthHandler:
         full_name, _, _, position, _, work_store_id, _ = user_data
         current_month = datetime.now().strftime('%Y-%m')
         
+        # Получаем графики и подмены всего магазина одним запросом
+        roster = await self.db.get_store_month_roster(work_store_id, current_month)
+        own_entry = next((entry for entry in roster if entry[0] == user_id), None)
+        if own_entry:
+            _, _, _, schedule, substitutions = own_entry
+        else:
+            # Пользователь не числится в магазине (например, без привязки)
+            schedule = await self.db.get_schedule(user_id, work_store_id, current_month)
+            substitutions = await self.db.get_user_substitutions(user_id, datetime.now())
+        
         # Формируем текст с графиком пользователя
         schedule_text = f"📅 График {full_name} на текущий месяц:\n\n"
-        schedule = self.db.get_schedule(user_id, work_store_id, current_month)
         
         if schedule:
             schedule_data = schedule
             for i, day in enumerate(schedule_data, 1):
-                schedule_text += f"{i:02d}: {'Смена' if day == 'С' else 'Выходной'}\n"
+                schedule_text += f"{i:02d}: {'Смена' if day == WORK_DAY else 'Выходной'}\n"
         else:
             schedule_text += "График не найден.\n"
         
         # Добавляем подмены пользователя
-        substitutions = self.db.get_user_substitutions(user_id, datetime.now())
         if substitutions:
             schedule_text += "\n🔄 Подмены в этом месяце:\n"
             for date, hours, store in substitutions:
                 schedule_text += f"📅 {date}: {hours}ч в {store}\n"
         
-        # Получаем коллег из того же магазина
-        colleagues = self.db.get_store_employees(work_store_id)
+        # Коллеги из того же магазина
         colleagues_text = ""
         
-        if colleagues:
-            for colleague_id, colleague_name, colleague_position in colleagues:
+        if roster:
+            for colleague_id, colleague_name, colleague_position, colleague_schedule, colleague_substitutions in roster:
                 if colleague_id != user_id:  # Пропускаем самого пользователя
                     colleagues_text += f"\n\n👤 {colleague_name} ({colleague_position}):\n"
                     
                     # График коллеги
-                    colleague_schedule = self.db.get_schedule(colleague_id, work_store_id, current_month)
                     if colleague_schedule:
                         colleagues_text += "📅 График:\n"
                         for i, day in enumerate(colleague_schedule, 1):
-                            colleagues_text += f"{i:02d}: {'Смена' if day == 'С' else 'Выходной'}\n"
+                            colleagues_text += f"{i:02d}: {'Смена' if day == WORK_DAY else 'Выходной'}\n"
                     else:
                         colleagues_text += "График не найден\n"
                     
                     # Подмены коллеги
-                    colleague_substitutions = self.db.get_user_substitutions(colleague_id, datetime.now())
                     if colleague_substitutions:
                         colleagues_text += "\n🔄 Подмены:\n"
                         for date, hours, store in colleague_substitutions:
@@ -1103,11 +1329,10 @@ class AuthHandler:
         
         # Отправляем сообщение частями, если оно слишком длинное
         if len(full_text) > 4096:
-            for x in range(0, len(full_text), 4096):
-                await update.message.reply_text(
-                    full_text[x:x+4096],
-                    reply_markup=ReplyKeyboardMarkup([['↩️ Назад']], resize_keyboard=True)
-                )
+            await self._send_bulk(
+                update, context, full_text,
+                reply_markup=ReplyKeyboardMarkup([['↩️ Назад']], resize_keyboard=True)
+            )
         else:
             await update.message.reply_text(
                 full_text,
@@ -1153,14 +1378,10 @@ class AuthHandler:
                 return CREATE_SCHEDULE
             
             # Создаем график: В - выходной, С - смена
-            schedule_data = ['В'] * days_in_month
-            for day in work_days:
-                schedule_data[day - 1] = 'С'
-            
-            schedule_string = ''.join(schedule_data)
+            schedule_string = decode_schedule(mask_from_days(work_days), days_in_month)
             current_month_str = datetime.now().strftime('%Y-%m')
             user_id = context.user_data.get('user_id')
-            user_data = self.db.get_user_data(user_id)
+            user_data = await self.db.get_user_data(user_id)
             
             if not user_data:
                 await update.message.reply_text("Ошибка: данные пользователя не найдены")
@@ -1168,12 +1389,12 @@ class AuthHandler:
 
             _, _, _, _, _, work_store_id, _ = user_data
             
-            self.db.save_schedule(user_id, work_store_id, current_month_str, schedule_string)
+            await self.db.save_schedule(user_id, work_store_id, current_month_str, schedule_string)
             
             # Форматируем график для отображения
             formatted_schedule = "\n".join(
-                f"{i+1}: {'Смена' if day == 'С' else 'Выходной'}"
-                for i, day in enumerate(schedule_data)
+                f"{i+1}: {'Смена' if day == WORK_DAY else 'Выходной'}"
+                for i, day in enumerate(schedule_string)
             )
             
             await update.message.reply_text(
@@ -1211,15 +1432,14 @@ class AuthHandler:
         if update.message.text == '↩️ Назад':
             return await self.show_schedule_menu(update, context)
         
-        stores = self.db.get_all_stores()
-        if not stores:
+        stores_list = await self.db.get_stores_text('{id}. {number} ({address})')
+        if not stores_list:
             await update.message.reply_text("В базе нет магазинов")
             return await self.show_schedule_menu(update, context)
         
-        stores_list = "\n".join([f"{store[0]}. {store[1]} ({store[2]})" for store in stores])
         await update.message.reply_text(
             f"Выберите магазин для подмены:\n\n{stores_list}\n\n"
-            "Введите номер магазина:",
+            "Введите номер магазина или часть адреса для поиска:",
             reply_markup=ReplyKeyboardMarkup([['↩️ Назад']], resize_keyboard=True)
         )
         return ADD_SUBSTITUTION_STORE
@@ -1231,7 +1451,7 @@ class AuthHandler:
         
         try:
             store_id = int(update.message.text)
-            store = self.db.get_store_by_id(store_id)
+            store = await self.db.get_store_by_id(store_id)
             
             if not store:
                 await update.message.reply_text("Магазин не найден. Попробуйте еще раз:")
@@ -1244,8 +1464,8 @@ class AuthHandler:
             )
             return ADD_SUBSTITUTION_DATE
         except ValueError:
-            await update.message.reply_text("Пожалуйста, введите корректный номер магазина")
-            return ADD_SUBSTITUTION_STORE
+            # Не номер - ищем магазин по адресу
+            return await self._send_store_search(update, update.message.text, ADD_SUBSTITUTION_STORE)
 
     async def handle_substitution_date(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка даты подмены"""
@@ -1285,15 +1505,15 @@ class AuthHandler:
                 substitutions = context.user_data.get('substitutions', [])
                 selected_index = int(context.user_data.get('selected_sub_index', 0))
                 _, _, store = substitutions[selected_index]
-                store_id = self.db.get_store_id_by_address(store)
+                store_id = await self.db.get_store_id_by_address(store)
                 
-                self.db.update_substitution(user_id, old_date, store_id, old_date, hours)
+                await self.db.update_substitution(user_id, old_date, store_id, old_date, hours)
                 await update.message.reply_text("✅ Подмена успешно обновлена!")
             else:
                 # Создаем новую подмену
                 store_id = context.user_data.get('sub_store_id')
                 date = context.user_data.get('sub_date')
-                self.db.save_substitution(user_id, store_id, date, hours)
+                await self.db.save_substitution(user_id, store_id, date, hours)
                 await update.message.reply_text("✅ Подмена успешно добавлена!")
             
             # Очищаем временные данные
@@ -1329,7 +1549,7 @@ class AuthHandler:
             return await self.show_schedule_menu(update, context)
 
         user_id = context.user_data.get('user_id')
-        substitutions = self.db.get_user_substitutions(user_id, datetime.now())
+        substitutions = await self.db.get_user_substitutions(user_id, datetime.now())
 
         if not substitutions:
             await update.message.reply_text(
@@ -1375,7 +1595,7 @@ class AuthHandler:
             user_id = context.user_data.get('user_id')
 
             if action == 'delete':
-                self.db.delete_substitution(user_id, date)
+                await self.db.delete_substitution(user_id, date)
                 await update.message.reply_text("✅ Подмена успешно удалена!")
                 return await self.show_schedule_menu(update, context)
             else:
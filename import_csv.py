@@ -0,0 +1,40 @@
+from database.db_handler import DatabaseHandler
+from config.config import DATABASE_NAME
+from utils.logger import setup_logger
+import argparse
+import os
+import sys
+
+# Создаем директорию для логов, если её нет
+os.makedirs('logs', exist_ok=True)
+
+logger = setup_logger()
+
+def main():
+    parser = argparse.ArgumentParser(description='Массовый импорт данных из CSV')
+    parser.add_argument('--stores', help='CSV магазинов: address[, store_number]')
+    parser.add_argument('--employees', help='CSV сотрудников: full_name, barcode[, position, store_number]')
+    parser.add_argument('--schedules', help='CSV графиков: barcode, month, days[, store_number]')
+    parser.add_argument('--db', default=DATABASE_NAME, help='Файл базы данных')
+    args = parser.parse_args()
+
+    if not (args.stores or args.employees or args.schedules):
+        parser.error('Укажите хотя бы один файл для импорта')
+
+    db = DatabaseHandler(args.db)
+    try:
+        # Порядок важен: сотрудники ссылаются на магазины, графики - на сотрудников
+        if args.stores:
+            db.import_stores_csv(args.stores)
+        if args.employees:
+            db.import_employees_csv(args.employees)
+        if args.schedules:
+            db.import_schedules_csv(args.schedules)
+    except (OSError, UnicodeDecodeError) as e:
+        logger.error(f"Ошибка при импорте: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,20 @@
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler
+from telegram.ext import Application, CommandHandler, ConversationHandler
 from telegram.error import TelegramError
-from config.config import BOT_TOKEN
+from config.config import BOT_TOKEN, DATABASE_NAME, DB_GROUP_COMMIT, DB_COMMIT_WINDOW_MS, DB_WORKERS, DB_READERS, ARCHIVE_KEEP_MONTHS, ARCHIVE_CHECK_INTERVAL, PERSISTENCE_UPDATE_INTERVAL, UPDATE_CONCURRENCY
+from config.config import BOT_MODE, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_URL
+from config.config import SEND_RATE_GLOBAL, SEND_RATE_PER_CHAT, SEND_BURST_PER_CHAT, SEND_MAX_RETRIES
 from database.db_handler import DatabaseHandler
+from database.async_db_handler import AsyncDatabaseHandler
+from database.persistence import SQLitePersistence
 from handlers.auth_handler import AuthHandler
 from handlers.common_handler import start, cancel, logout
 from utils.states import *
+from utils.menu_router import MenuRouter, BACK
+from utils.update_processor import PerUserUpdateProcessor
+from utils.webhook_server import run_webhook
+from utils.rate_limiter import PriorityRateLimiter
+from utils.archive_scheduler import ArchiveScheduler
 from utils.logger import setup_logger
 import os
 import sys
@@ -27,168 +36,158 @@ def main():
         logger.info("Запуск бота...")
         
         # Инициализация базы данных
-        db = DatabaseHandler('users.db')
-        db.setup_database()
+        database = DatabaseHandler(DATABASE_NAME, readers=DB_READERS, group_commit=DB_GROUP_COMMIT,
+                                   commit_window=DB_COMMIT_WINDOW_MS / 1000)
+        # Старые месяцы переносим в архив до начала обработки обновлений
+        database.archive_old_months(ARCHIVE_KEEP_MONTHS)
+        db = AsyncDatabaseHandler(database, workers=DB_WORKERS)
         logger.info("База данных инициализирована")
         
         # Инициализация обработчика авторизации
-        auth_handler = AuthHandler()
+        auth_handler = AuthHandler(db)
         
         # Создаем приложение
-        application = Application.builder().token(BOT_TOKEN).build()
+        # Состояния диалогов и user_data переживают перезапуск бота
+        persistence = SQLitePersistence(db, update_interval=PERSISTENCE_UPDATE_INTERVAL)
+        # Во время работы граница архива сдвигается со сменой месяца
+        archiver = ArchiveScheduler(db, ARCHIVE_KEEP_MONTHS, interval=ARCHIVE_CHECK_INTERVAL)
+        # Разные пользователи обслуживаются параллельно, обновления одного - по очереди;
+        # исходящие сообщения проходят через очередь с лимитами Telegram
+        application = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .persistence(persistence)
+            .concurrent_updates(PerUserUpdateProcessor(UPDATE_CONCURRENCY))
+            .rate_limiter(PriorityRateLimiter(
+                global_rate=SEND_RATE_GLOBAL,
+                chat_rate=SEND_RATE_PER_CHAT,
+                chat_burst=SEND_BURST_PER_CHAT,
+                max_retries=SEND_MAX_RETRIES,
+            ))
+            .post_init(archiver.start)
+            .post_stop(archiver.stop)
+            .build()
+        )
         logger.info(f"Приложение создано с токеном: {BOT_TOKEN[:10]}...")
 
         # Добавляем обработчик ошибок
         application.add_error_handler(error_handler)
 
+        # Таблица переходов по кнопкам меню для всех состояний диалога
+        router = MenuRouter()
+        router.state(LOGIN, {
+            '🔐 Регистрация': auth_handler.register,
+            '🔑 Авторизация': auth_handler.authorize,
+            '🏪 Регистрация магазина': auth_handler.start_add_store,
+            '🏪 Авторизоваться в магазин': auth_handler.start_store_auth,
+            '↩️ В главное меню': start,
+            BACK: start,
+        })
+        router.state(STORE_AUTH, text=auth_handler.handle_store_auth)
+        router.state(STORE_ADDRESS, text=auth_handler.get_store_address)
+        router.state(FULL_NAME, text=auth_handler.get_full_name)
+        router.state(BARCODE, text=auth_handler.get_barcode)
+        router.state(BARCODE_AUTH, text=auth_handler.check_auth_barcode)
+        router.state(MENU, {
+            '✏️ Редактировать профиль': auth_handler.show_edit_menu,
+            '🔐 Получить права админа': auth_handler.request_admin_rights,
+            '👑 Админ-панель': auth_handler.show_admin_panel,
+            '🚪 Выйти': logout,
+            '📅 График': auth_handler.show_schedule_menu,
+        })
+        router.state(ADMIN_CODE, text=auth_handler.check_admin_code)
+        router.state(EDIT_CHOICE, {
+            '📝 Изменить ФИО': auth_handler.edit_name,
+            '🔢 Изменить штрих-код': auth_handler.edit_barcode,
+            '📅 Указать дату трудоустройства': auth_handler.edit_hire_date,
+            '🏪 Выбрать магазин': auth_handler.show_stores_list,
+            BACK: auth_handler.show_menu,
+        })
+        router.state(SELECT_STORE, text=auth_handler.handle_store_selection)
+        router.state(EDIT_NAME, text=auth_handler.save_new_name)
+        router.state(EDIT_BARCODE, text=auth_handler.save_new_barcode)
+        router.state(EDIT_HIRE_DATE, text=auth_handler.save_hire_date)
+        router.state(ADMIN_MENU, {
+            '👥 Управление сотрудниками': auth_handler.show_users_list,
+            '🏪 Управление магазинами': auth_handler.show_stores_menu,
+            '👨‍💼 Управление администраторами': auth_handler.show_administrators,
+            '📊 Покрытие смен': auth_handler.show_coverage_report,
+            '⏱ Часы по магазинам': auth_handler.show_hours_report,
+            BACK: auth_handler.show_menu,
+        })
+        router.state(STORES_MENU, {
+            '➕ Добавить магазин': auth_handler.start_add_store,
+            '❌ Удалить магазин': auth_handler.delete_store_start,
+            '👥 Сотрудники магазина': auth_handler.show_store_employees,
+            BACK: auth_handler.show_admin_panel,
+        })
+        router.state(DELETE_STORE, text=auth_handler.handle_store_deletion)
+        router.state(SELECT_STORE_EMPLOYEES, text=auth_handler.show_employees_list)
+        router.state(SELECT_EMPLOYEE, text=auth_handler.handle_employee_selection)
+        router.state(EMPLOYEE_ACTIONS, {
+            '❌ Удалить сотрудника': auth_handler.delete_employee,
+            '🏪 Указать магазин': auth_handler.show_transfer_stores,
+            BACK: auth_handler.show_employees_list,
+        })
+        router.state(TRANSFER_STORE, text=auth_handler.reassign_employee_store)
+        router.state(SELECT_ADMIN, text=auth_handler.handle_admin_selection)
+        router.state(ASSIGN_STORES, {
+            '🏪 Прикрепить магазины': auth_handler.show_stores_for_assignment,
+        }, text=auth_handler.handle_store_assignment)
+        router.state(SELECT_USER, text=auth_handler.handle_user_selection)
+        router.state(SELECT_POSITION, text=auth_handler.handle_position_selection)
+        router.state(EDIT_STORE, text=auth_handler.handle_store_edit)
+        router.state(USER_MANAGEMENT, {
+            '👔 Изменить должность': auth_handler.show_position_selection,
+            '🏪 Изменить магазин': auth_handler.show_store_selection,
+            '❌ Удалить админ права': auth_handler.remove_admin_rights,
+            BACK: auth_handler.show_users_list,
+        })
+        router.state(SCHEDULE_MENU, {
+            '👁 Посмотреть график': auth_handler.view_schedule,
+            '✏️ Редактировать график': auth_handler.edit_schedule,
+            '➕ Создать график': auth_handler.create_schedule,
+            '🔄 Добавить подмену': auth_handler.start_add_substitution,
+            '📝 Редактировать подмену': auth_handler.edit_substitution_menu,
+            BACK: auth_handler.show_menu,
+        })
+        router.state(CREATE_SCHEDULE, text=auth_handler.save_schedule)
+        router.state(EDIT_SCHEDULE, text=auth_handler.save_schedule)
+        router.state(VIEW_SCHEDULE, {BACK: auth_handler.show_schedule_menu})
+        router.state(ADD_SUBSTITUTION_STORE, text=auth_handler.handle_substitution_store)
+        router.state(ADD_SUBSTITUTION_DATE, text=auth_handler.handle_substitution_date)
+        router.state(ADD_SUBSTITUTION_HOURS, text=auth_handler.handle_substitution_hours)
+        router.state(EDIT_SUBSTITUTION, text=auth_handler.handle_substitution_edit_choice)
+        router.state(SELECT_SUBSTITUTION_DATE, text=auth_handler.handle_substitution_date_selection)
+
         # Создаем ConversationHandler
         conv_handler = ConversationHandler(
             entry_points=[CommandHandler('start', start)],
-            states={
-                LOGIN: [
-                    MessageHandler(filters.Regex('^🔐 Регистрация$'), auth_handler.register),
-                    MessageHandler(filters.Regex('^🔑 Авторизация$'), auth_handler.authorize),
-                    MessageHandler(filters.Regex('^🏪 Регистрация магазина$'), auth_handler.start_add_store),
-                    MessageHandler(filters.Regex('^🏪 Авторизоваться в магазин$'), auth_handler.start_store_auth),
-                    MessageHandler(filters.Regex('^↩️ В главное меню$'), start),
-                    MessageHandler(filters.Regex('^↩️ Назад$'), start),
-                ],
-                STORE_AUTH: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_store_auth)
-                ],
-                STORE_ADDRESS: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.get_store_address)
-                ],
-                FULL_NAME: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.get_full_name)
-                ],
-                BARCODE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.get_barcode)
-                ],
-                BARCODE_AUTH: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.check_auth_barcode)
-                ],
-                MENU: [
-                    MessageHandler(filters.Regex('^✏️ Редактировать профиль$'), auth_handler.show_edit_menu),
-                    MessageHandler(filters.Regex('^🔐 Получить права админа$'), auth_handler.request_admin_rights),
-                    MessageHandler(filters.Regex('^👑 Админ-панель$'), auth_handler.show_admin_panel),
-                    MessageHandler(filters.Regex('^🚪 Выйти$'), logout),
-                    MessageHandler(filters.Regex('^📅 График$'), auth_handler.show_schedule_menu),
-                ],
-                ADMIN_CODE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.check_admin_code)
-                ],
-                EDIT_CHOICE: [
-                    MessageHandler(filters.Regex('^📝 Изменить ФИО$'), auth_handler.edit_name),
-                    MessageHandler(filters.Regex('^🔢 Изменить штрих-код$'), auth_handler.edit_barcode),
-                    MessageHandler(filters.Regex('^📅 Указать дату трудоустройства$'), auth_handler.edit_hire_date),
-                    MessageHandler(filters.Regex('^🏪 Выбрать магазин$'), auth_handler.show_stores_list),
-                    MessageHandler(filters.Regex('^↩️ Назад$'), auth_handler.show_menu),
-                ],
-                SELECT_STORE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_store_selection)
-                ],
-                EDIT_NAME: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.save_new_name)
-                ],
-                EDIT_BARCODE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.save_new_barcode)
-                ],
-                EDIT_HIRE_DATE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.save_hire_date)
-                ],
-                ADMIN_MENU: [
-                    MessageHandler(filters.Regex('^👥 Управление сотрудниками$'), auth_handler.show_users_list),
-                    MessageHandler(filters.Regex('^🏪 Управление магазинами$'), auth_handler.show_stores_menu),
-                    MessageHandler(filters.Regex('^👨‍💼 Управление администраторами$'), auth_handler.show_administrators),
-                    MessageHandler(filters.Regex('^↩️ Назад$'), auth_handler.show_menu),
-                ],
-                STORES_MENU: [
-                    MessageHandler(filters.Regex('^➕ Добавить магазин$'), auth_handler.start_add_store),
-                    MessageHandler(filters.Regex('^❌ Удалить магазин$'), auth_handler.delete_store_start),
-                    MessageHandler(filters.Regex('^👥 Сотрудники магазина$'), auth_handler.show_store_employees),
-                    MessageHandler(filters.Regex('^↩️ Назад$'), auth_handler.show_admin_panel),
-                ],
-                DELETE_STORE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_store_deletion)
-                ],
-                SELECT_STORE_EMPLOYEES: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.show_employees_list)
-                ],
-                SELECT_EMPLOYEE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_employee_selection)
-                ],
-                EMPLOYEE_ACTIONS: [
-                    MessageHandler(filters.Regex('^❌ Удалить сотрудника$'), auth_handler.delete_employee),
-                    MessageHandler(filters.Regex('^🏪 Указать магазин$'), auth_handler.show_stores_list),
-                    MessageHandler(filters.Regex('^↩️ Назад$'), auth_handler.show_employees_list),
-                ],
-                SELECT_ADMIN: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_admin_selection)
-                ],
-                ASSIGN_STORES: [
-                    MessageHandler(filters.Regex('^🏪 Прикрепить магазины$'), auth_handler.show_stores_for_assignment),
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_store_assignment)
-                ],
-                SELECT_USER: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_user_selection)
-                ],
-                SELECT_POSITION: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_position_selection)
-                ],
-                EDIT_STORE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_store_edit)
-                ],
-                USER_MANAGEMENT: [
-                    MessageHandler(filters.Regex('^👔 Изменить должность$'), auth_handler.show_position_selection),
-                    MessageHandler(filters.Regex('^🏪 Изменить магазин$'), auth_handler.show_store_selection),
-                    MessageHandler(filters.Regex('^❌ Удалить админ права$'), auth_handler.remove_admin_rights),
-                    MessageHandler(filters.Regex('^↩️ Назад$'), auth_handler.show_users_list),
-                ],
-                SCHEDULE_MENU: [
-                    MessageHandler(filters.Regex('^👁 Посмотреть график$'), auth_handler.view_schedule),
-                    MessageHandler(filters.Regex('^✏️ Редактировать график$'), auth_handler.edit_schedule),
-                    MessageHandler(filters.Regex('^➕ Создать график$'), auth_handler.create_schedule),
-                    MessageHandler(filters.Regex('^🔄 Добавить подмену$'), auth_handler.start_add_substitution),
-                    MessageHandler(filters.Regex('^📝 Редактировать подмену$'), auth_handler.edit_substitution_menu),
-                    MessageHandler(filters.Regex('^↩️ Назад$'), auth_handler.show_menu),
-                ],
-                CREATE_SCHEDULE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.save_schedule),
-                ],
-                EDIT_SCHEDULE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.save_schedule),
-                ],
-                VIEW_SCHEDULE: [
-                    MessageHandler(filters.Regex('^↩️ Назад$'), auth_handler.show_schedule_menu),
-                ],
-                ADD_SUBSTITUTION_STORE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_substitution_store),
-                ],
-                ADD_SUBSTITUTION_DATE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_substitution_date),
-                ],
-                ADD_SUBSTITUTION_HOURS: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_substitution_hours),
-                ],
-                EDIT_SUBSTITUTION: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_substitution_edit_choice)
-                ],
-                SELECT_SUBSTITUTION_DATE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, auth_handler.handle_substitution_date_selection)
-                ],
-            },
+            states=router.build(),
             fallbacks=[CommandHandler('cancel', cancel)],
             allow_reentry=True,
-            name='main_conversation'
+            name='main_conversation',
+            persistent=True
         )
 
         logger.info("Добавление обработчика конверсации")
         application.add_handler(conv_handler)
         
-        # Запускаем бота
-        logger.info("Запуск процесса поллинга")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        # Запускаем бота: обработчики работают только с сообщениями
+        allowed_updates = [Update.MESSAGE]
+        if BOT_MODE == 'webhook':
+            logger.info("Запуск в режиме webhook")
+            asyncio.run(run_webhook(
+                application, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET, webhook_url=WEBHOOK_URL,
+                allowed_updates=allowed_updates,
+            ))
+        else:
+            logger.info("Запуск процесса поллинга")
+            application.run_polling(allowed_updates=allowed_updates)
+
+        # Закрываем соединения с базой после остановки бота
+        db.close()
 
     except Exception as e:
         logger.error(f"Критическая ошибка при запуске бота: {e}")
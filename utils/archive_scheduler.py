@@ -0,0 +1,51 @@
+import asyncio
+import sqlite3
+import logging
+from typing import Optional
+
+from telegram.ext import Application
+
+from database.async_db_handler import AsyncDatabaseHandler
+
+logger = logging.getLogger('TelegramBot')
+
+
+class ArchiveScheduler:
+    """Периодический перенос старых месяцев в архив во время работы бота
+
+    Раз в interval секунд вызывает archive_old_months: пока граница архива
+    не сдвинулась, это один индексный запрос, а после смены месяца
+    переносятся месяцы, вышедшие за keep_months. Запускается и
+    останавливается хуками Application (post_init/post_stop), поэтому
+    не требует JobQueue.
+    """
+
+    def __init__(self, db: AsyncDatabaseHandler, keep_months: int, interval: float = 3600):
+        self.db = db
+        self.keep_months = keep_months
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, application: Application) -> None:
+        """Запуск фоновой задачи"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, application: Application) -> None:
+        """Остановка фоновой задачи"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """Проверка границы архива раз в interval секунд"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.db.archive_old_months(self.keep_months)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка архивации старых месяцев: {e}")
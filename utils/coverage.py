@@ -0,0 +1,48 @@
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+
+class CoverageReport(NamedTuple):
+    """Покрытие смен по магазинам за месяц"""
+    store_ids: List[int]
+    headcount: np.ndarray      # (магазины x дни): людей на смене
+    totals: np.ndarray         # смен за месяц по магазинам
+    understaffed: np.ndarray   # (магазины x дни): меньше минимума
+
+
+def compute_coverage(store_ids: List[int],
+                     shift_masks: List[Tuple[int, int]],
+                     substitution_days: List[Tuple[int, int]],
+                     days_in_month: int,
+                     min_staff: int) -> CoverageReport:
+    """Расчет покрытия смен для всех магазинов за один проход
+
+    shift_masks - пары (store_id, shift_mask) из графиков,
+    substitution_days - пары (store_id, день месяца) из подмен.
+    """
+    row_of = {store_id: i for i, store_id in enumerate(store_ids)}
+    headcount = np.zeros((len(store_ids), days_in_month), dtype=np.int32)
+
+    # Графики: раскладываем маски на биты дней и суммируем по магазинам
+    rows = [(row_of[store_id], mask) for store_id, mask in shift_masks
+            if store_id in row_of and mask]
+    if rows:
+        store_rows = np.fromiter((row for row, _ in rows), dtype=np.intp, count=len(rows))
+        masks = np.fromiter((mask for _, mask in rows), dtype=np.int64, count=len(rows))
+        bits = (masks[:, None] >> np.arange(days_in_month, dtype=np.int64)) & 1
+        np.add.at(headcount, store_rows, bits.astype(np.int32))
+
+    # Подмены добавляют по человеку в свой день
+    subs = [(row_of[store_id], day - 1) for store_id, day in substitution_days
+            if store_id in row_of and 1 <= day <= days_in_month]
+    if subs:
+        sub_rows, sub_days = np.array(subs, dtype=np.intp).T
+        np.add.at(headcount, (sub_rows, sub_days), 1)
+
+    return CoverageReport(
+        store_ids=list(store_ids),
+        headcount=headcount,
+        totals=headcount.sum(axis=1),
+        understaffed=headcount < min_staff,
+    )
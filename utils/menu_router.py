@@ -0,0 +1,64 @@
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes, MessageHandler, filters
+
+logger = logging.getLogger('TelegramBot')
+
+# Кнопка возврата, общая для большинства меню
+BACK = '↩️ Назад'
+
+Callback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[Optional[int]]]
+
+
+class MenuRouter:
+    """Таблица переходов по кнопкам меню: (состояние, текст кнопки) -> обработчик
+
+    Для каждого состояния регистрируется один MessageHandler, который
+    находит обработчик кнопки поиском по словарю. Текст, не совпавший ни
+    с одной кнопкой, передается обработчику произвольного ввода состояния,
+    а если его нет - игнорируется, и диалог остается в том же состоянии.
+    """
+
+    def __init__(self):
+        self._buttons: Dict[int, Dict[str, Callback]] = {}
+        self._text: Dict[int, Callback] = {}
+
+    def state(self, state: int, buttons: Optional[Dict[str, Callback]] = None,
+              text: Optional[Callback] = None) -> 'MenuRouter':
+        """Регистрация кнопок и обработчика произвольного текста для состояния"""
+        state_buttons = self._buttons.setdefault(state, {})
+        for label, callback in (buttons or {}).items():
+            if label in state_buttons:
+                raise ValueError(f"Кнопка '{label}' уже зарегистрирована для состояния {state}")
+            state_buttons[label] = callback
+        if text is not None:
+            if state in self._text:
+                raise ValueError(f"Обработчик текста уже зарегистрирован для состояния {state}")
+            self._text[state] = text
+        return self
+
+    def build(self) -> Dict[int, List[MessageHandler]]:
+        """Построение словаря states для ConversationHandler"""
+        handler_filter = filters.TEXT & ~filters.COMMAND
+        states = {
+            state: [MessageHandler(handler_filter, self._dispatcher(state))]
+            for state in self._buttons.keys() | self._text.keys()
+        }
+        logger.info(f"Маршрутизатор меню: состояний {len(states)}, "
+                    f"кнопок {sum(len(buttons) for buttons in self._buttons.values())}")
+        return states
+
+    def _dispatcher(self, state: int) -> Callback:
+        """Обработчик состояния с поиском кнопки по словарю"""
+        buttons = self._buttons.get(state, {})
+        text = self._text.get(state)
+
+        async def dispatch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
+            callback = buttons.get(update.message.text, text)
+            if callback is None:
+                return None
+            return await callback(update, context)
+
+        return dispatch
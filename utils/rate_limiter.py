@@ -0,0 +1,267 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Deque, Dict, List, Optional, Tuple
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger('TelegramBot')
+
+# Приоритеты отправки, передаются через rate_limit_args
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+
+class _TokenBucket:
+    """Корзина токенов: rate отправок в секунду с запасом до capacity"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд появится токен"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        """Корзина полна - ее можно удалить без потери ограничения"""
+        self.delay(now)
+        return self.tokens >= self.capacity
+
+
+class _SendRequest:
+    """Запрос, ожидающий разрешения на отправку"""
+    __slots__ = ('chat_id', 'priority', 'enqueued', 'granted')
+
+    def __init__(self, chat_id: object, priority: int, enqueued: float):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.enqueued = enqueued
+        self.granted = asyncio.get_running_loop().create_future()
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Ограничение частоты отправки сообщений с приоритетами
+
+    Запросы с chat_id ставятся в очередь своего приоритета и пропускаются
+    по общей корзине токенов (global_rate в секунду) и корзине чата
+    (chat_rate в секунду с запасом chat_burst). Интерактивные ответы
+    (PRIORITY_INTERACTIVE) всегда уходят раньше массовых отправок
+    (PRIORITY_BULK), а внутри приоритета - в порядке поступления; запрос
+    чата, исчерпавшего лимит, не задерживает запросы других чатов.
+
+    При RetryAfter отправка всех запросов приостанавливается на указанное
+    Telegram время, после чего запрос повторяется вне очереди, но не
+    больше max_retries раз. Запросы без chat_id (getUpdates, setWebhook и
+    т.п.) выполняются без ограничений.
+
+    Статистика очереди и ожидания доступна через stats() и раз в
+    report_interval секунд пишется в лог.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3,
+                 max_retries: int = 3, report_interval: float = 300):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.report_interval = report_interval
+        self._queues: List[Deque[_SendRequest]] = [deque(), deque()]
+        self._global: Optional[_TokenBucket] = None
+        self._chats: Dict[object, _TokenBucket] = {}
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._sent = [0, 0]
+        self._wait_total = [0.0, 0.0]
+        self._wait_max = [0.0, 0.0]
+        self._max_depth = 0
+        self._retries = 0
+
+    async def initialize(self) -> None:
+        """Запуск диспетчера очереди в цикле событий приложения"""
+        # Application и Updater инициализируют бота каждый сам по себе
+        if self._dispatcher is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._global = _TokenBucket(self.global_rate, self.global_rate, loop.time())
+        self._wakeup = asyncio.Event()
+        self._last_report = loop.time()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        logger.info(f"Ограничение отправки: {self.global_rate}/с всего, "
+                    f"{self.chat_rate}/с на чат (запас {self.chat_burst})")
+
+    async def shutdown(self) -> None:
+        """Остановка диспетчера, ожидающие запросы отменяются"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for queue in self._queues:
+            for request in queue:
+                request.granted.cancel()
+            queue.clear()
+        self._report()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Any:
+        """Выполнение запроса после получения разрешения из очереди"""
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await callback(*args, **kwargs)
+
+        priority = PRIORITY_BULK if rate_limit_args == PRIORITY_BULK else PRIORITY_INTERACTIVE
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority, retry=attempt > 0)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    logger.error(f"{endpoint}: лимит Telegram не снят после {attempt} повторов")
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                loop = asyncio.get_running_loop()
+                self._paused_until = max(self._paused_until, loop.time() + retry_after + 0.1)
+                self._retries += 1
+                logger.warning(f"{endpoint}: лимит Telegram, отправка приостановлена "
+                               f"на {retry_after} с")
+
+    async def _acquire(self, chat_id: object, priority: int, retry: bool):
+        """Ожидание своей очереди на отправку"""
+        request = _SendRequest(chat_id, priority, asyncio.get_running_loop().time())
+        queue = self._queues[priority]
+        # Повтор после RetryAfter уже отстоял свою очередь
+        if retry:
+            queue.appendleft(request)
+        else:
+            queue.append(request)
+        self._max_depth = max(self._max_depth, sum(len(q) for q in self._queues))
+        self._wakeup.set()
+        await request.granted
+
+    def _next_ready(self, now: float) -> Tuple[Optional[_SendRequest], float]:
+        """Первый запрос по приоритету, чат которого не исчерпал лимит
+
+        Если такого нет, возвращает время до появления токена у ближайшего чата.
+        """
+        min_delay = float('inf')
+        blocked = set()
+        for queue in self._queues:
+            i = 0
+            while i < len(queue):
+                request = queue[i]
+                if request.granted.done():
+                    # Вызывающий отменил ожидание
+                    del queue[i]
+                    continue
+                if request.chat_id not in blocked:
+                    bucket = self._chats.get(request.chat_id)
+                    if bucket is None:
+                        bucket = self._chats[request.chat_id] = _TokenBucket(
+                            self.chat_rate, self.chat_burst, now)
+                    delay = bucket.delay(now)
+                    if not delay:
+                        del queue[i]
+                        return request, 0.0
+                    blocked.add(request.chat_id)
+                    min_delay = min(min_delay, delay)
+                i += 1
+        return None, min_delay
+
+    async def _dispatch_loop(self):
+        """Выдача разрешений на отправку по корзинам токенов"""
+        loop = asyncio.get_running_loop()
+        while True:
+            if not any(self._queues):
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = loop.time()
+            delay = max(self._paused_until - now, self._global.delay(now))
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            request, delay = self._next_ready(now)
+            if request is None:
+                self._wakeup.clear()
+                if delay != float('inf'):
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                continue
+
+            self._global.take()
+            self._chats[request.chat_id].take()
+            request.granted.set_result(None)
+
+            waited = now - request.enqueued
+            self._sent[request.priority] += 1
+            self._wait_total[request.priority] += waited
+            self._wait_max[request.priority] = max(self._wait_max[request.priority], waited)
+
+            if now - self._last_report >= self.report_interval:
+                self._last_report = now
+                self._report()
+                self._reset_stats()
+                # Полные корзины ничего не ограничивают
+                self._chats = {chat_id: bucket for chat_id, bucket in self._chats.items()
+                               if not bucket.idle(now)}
+
+    def stats(self) -> dict:
+        """Статистика с последнего отчета: глубина очереди и время ожидания"""
+        stats = {
+            'queue_depth': sum(len(queue) for queue in self._queues),
+            'max_queue_depth': self._max_depth,
+            'retries': self._retries,
+        }
+        for priority, name in ((PRIORITY_INTERACTIVE, 'interactive'), (PRIORITY_BULK, 'bulk')):
+            sent = self._sent[priority]
+            stats[name] = {
+                'sent': sent,
+                'avg_wait': self._wait_total[priority] / sent if sent else 0.0,
+                'max_wait': self._wait_max[priority],
+            }
+        return stats
+
+    def _report(self):
+        """Запись статистики в лог, если что-то отправлялось"""
+        stats = self.stats()
+        if not stats['interactive']['sent'] and not stats['bulk']['sent']:
+            return
+        logger.info(
+            f"Очередь отправки: сейчас {stats['queue_depth']}, максимум {stats['max_queue_depth']}, "
+            f"повторов {stats['retries']}; "
+            + "; ".join(
+                f"{name}: {s['sent']} сообщ., ожидание ср. {s['avg_wait'] * 1000:.0f} мс, "
+                f"макс. {s['max_wait'] * 1000:.0f} мс"
+                for name, s in (('интерактивные', stats['interactive']), ('массовые', stats['bulk']))
+            )
+        )
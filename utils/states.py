@@ -41,5 +41,6 @@ from telegram.ext import ConversationHandler
     ADD_SUBSTITUTION_HOURS,  # 37
     EDIT_SUBSTITUTION,      # 38
     DELETE_SUBSTITUTION,    # 39
-    SELECT_SUBSTITUTION_DATE  # 40
-) = range(40)
\ No newline at end of file
+    SELECT_SUBSTITUTION_DATE, # 40
+    TRANSFER_STORE          # 41
+) = range(41)
\ No newline at end of file
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger('TelegramBot')
+
+
+class _UserSlot:
+    """Блокировка обновлений одного пользователя и число ее ожидающих"""
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений разных пользователей
+
+    Обновления одного пользователя обрабатываются строго по очереди в
+    порядке поступления, поэтому состояние ConversationHandler и
+    user_data не портятся гонками. Обновления разных пользователей
+    обрабатываются параллельно, но одновременно выполняется не больше
+    max_concurrent_updates обработчиков. Обновления, ждущие своей очереди
+    у того же пользователя, слотов выполнения не занимают; общее число
+    принятых в обработку обновлений ограничено max_pending_updates.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: Optional[int] = None):
+        super().__init__(max_pending_updates or max_concurrent_updates * 8)
+        self.concurrency = max_concurrent_updates
+        self._running: Optional[asyncio.Semaphore] = None
+        self._slots: Dict[object, _UserSlot] = {}
+
+    async def initialize(self) -> None:
+        """Создание семафора в цикле событий приложения"""
+        self._running = asyncio.Semaphore(self.concurrency)
+        logger.info(f"Параллельная обработка обновлений: до {self.concurrency} одновременно")
+
+    async def shutdown(self) -> None:
+        """Освобождать нечего: блокировки удаляются вместе с последним ожидающим"""
+
+    def _update_key(self, update: object) -> Optional[object]:
+        """Ключ очереди: пользователь, а для обновлений без пользователя - чат"""
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                return ('user', update.effective_user.id)
+            if update.effective_chat is not None:
+                return ('chat', update.effective_chat.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Обработка обновления в очереди своего пользователя"""
+        key = self._update_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _UserSlot()
+        slot.users += 1
+        try:
+            # asyncio.Lock пропускает ожидающих в порядке очереди
+            async with slot.lock:
+                async with self._running:
+                    await coroutine
+        finally:
+            slot.users -= 1
+            if not slot.users:
+                del self._slots[key]
@@ -0,0 +1,164 @@
+import asyncio
+import hmac
+import json
+import signal
+import logging
+from typing import List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger('TelegramBot')
+
+# Заголовок, в котором Telegram передает secret_token из setWebhook
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+# Ограничение размера тела запроса с обновлением
+MAX_BODY_SIZE = 1024 * 1024
+
+_STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+                405: 'Method Not Allowed', 413: 'Payload Too Large'}
+
+
+class WebhookServer:
+    """Локальный HTTP-сервер для приема обновлений Telegram (webhook)
+
+    Принимает POST-запросы с JSON обновления на path и кладет их в
+    application.update_queue, откуда их забирает Application, как и при
+    поллинге. Проверить локально можно, отправив записанное обновление:
+
+        curl -X POST http://127.0.0.1:8443/telegram \\
+             -H 'X-Telegram-Bot-Api-Secret-Token: <WEBHOOK_SECRET>' \\
+             -H 'Content-Type: application/json' -d @update.json
+    """
+
+    def __init__(self, application: Application, host: str, port: int, path: str,
+                 secret_token: Optional[str] = None):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self):
+        """Запуск приема соединений"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logger.info(f"Webhook слушает http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        """Остановка приема соединений"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Обработка соединения: несколько запросов подряд при keep-alive"""
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status = await self._handle_request(method, path, headers, body)
+                # Непрочитанное тело нельзя принять за следующий запрос
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and len(body) == int(headers.get('content-length', 0)))
+                writer.write(
+                    f"HTTP/1.1 {status} {_STATUS_TEXT[status]}\r\n"
+                    f"Content-Length: 0\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            logger.debug(f"Webhook: соединение прервано: {e}")
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, dict, bytes]]:
+        """Чтение одного HTTP-запроса: (метод, путь, заголовки, тело)"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY_SIZE:
+            return method, path, headers, b''
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def _handle_request(self, method: str, path: str, headers: dict, body: bytes) -> int:
+        """Проверка запроса и передача обновления в Application, возвращает код ответа"""
+        if int(headers.get('content-length', 0)) > MAX_BODY_SIZE:
+            return 413
+        if path.split('?', 1)[0] != self.path:
+            return 404
+        if method != 'POST':
+            return 405
+        if self.secret_token and not hmac.compare_digest(
+                headers.get(SECRET_HEADER, ''), self.secret_token):
+            logger.warning("Webhook: запрос с неверным secret token")
+            return 403
+
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Webhook: некорректное обновление: {e}")
+            return 400
+        await self.application.update_queue.put(update)
+        return 200
+
+
+async def run_webhook(application: Application, host: str, port: int, path: str,
+                      secret_token: Optional[str] = None, webhook_url: Optional[str] = None,
+                      allowed_updates: Optional[List[str]] = None):
+    """Запуск Application с приемом обновлений через локальный webhook-сервер
+
+    Если задан webhook_url, адрес регистрируется в Telegram через setWebhook;
+    в этом случае secret_token обязателен, иначе любой, кто может достучаться
+    до сервера, сможет прислать поддельное обновление от имени любого
+    пользователя. Работает до SIGINT/SIGTERM.
+    """
+    if webhook_url and not secret_token:
+        raise ValueError("Для публичного webhook (WEBHOOK_URL) необходимо задать WEBHOOK_SECRET")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    server = WebhookServer(application, host, port, path, secret_token)
+    # Хуки post_init/post_stop/post_shutdown вызываются так же, как в run_polling
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        if webhook_url:
+            await application.bot.set_webhook(
+                url=webhook_url,
+                secret_token=secret_token,
+                allowed_updates=allowed_updates,
+            )
+            logger.info(f"Webhook зарегистрирован: {webhook_url}")
+        try:
+            await stop.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)